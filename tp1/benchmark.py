@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+
+"""Benchmark of the chemical tools.
+
+It runs, in-process, the core functions of chemical (in each of its modes), chemicalPlot (counting of element
+occurrences) and chemicalLatex (processing of each word of the text, without PubChem searches) over the word
+lists in texts/ and over a synthetic corpus of long words, reporting for each one the number of words per second
+and the peak memory allocated. The results are saved as JSON, with information about the run, and can be
+compared with the results of a previous run (--compare), so that changes to the segmentation layer can be
+checked for performance regressions.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import getopt
+import platform
+import subprocess
+import tracemalloc
+from collections import OrderedDict
+
+from chemical import processLines
+from chemicalPlot import countOccurrences
+from chemicalLatex import processWord
+from chemicalCore import CHEMICAL_SYMBOLS, TRIE_CS, FORMULA_TRIE_CS
+from compositionCache import openCache
+from periodicTable import loadPeriodicTable
+
+BASEDIR = os.path.dirname(os.path.abspath(__file__))
+CORPORA = ['texts/palavras.txt', 'texts/cleanwords.txt']
+REPEATS = 3
+
+# Nº de palavras, tamanhos mínimo e máximo (em símbolos químicos) e semente do corpus sintético de palavras longas
+SYNTHETIC_WORDS = 2000
+SYNTHETIC_SIZE = (8, 14)
+SYNTHETIC_SEED = 1819
+
+
+# Processar argumentos do comando
+def processArgs():
+    outputfile = ''
+    comparefile = ''
+    repeats = REPEATS
+    select = ''
+    usage = 'benchmark [-r <repeats>] [-b <benchmark>] [-c <previousresults>] [-o <outputfile>]'
+
+    # Processar opções/argumentos do comando utilizado
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'r:b:c:o:h', ['repeats=', 'benchmark=', 'compare=', 'ofile=', 'help'])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            print(usage)
+            sys.exit()
+        elif opt in ('-r', '--repeats'):
+            if not arg.isdigit() or int(arg) == 0:
+                print(usage)
+                sys.exit(2)
+            repeats = int(arg)
+        elif opt in ('-b', '--benchmark'):
+            select = arg
+        elif opt in ('-c', '--compare'):
+            comparefile = arg
+        elif opt in ('-o', '--ofile'):
+            outputfile = arg
+
+    return outputfile, comparefile, repeats, select
+
+
+# Ler as palavras de um corpus (uma palavra por linha, sendo a palavra a última coluna, como no chemicalPlot)
+def loadCorpus(filename):
+    fd = open(os.path.join(BASEDIR, filename))
+    words = [line.rstrip().split('\t')[-1] for line in fd]
+    fd.close()
+    return [w for w in words if w]
+
+
+# Gerar um corpus de palavras longas compostas por símbolos químicos (sempre o mesmo, dada a semente)
+def syntheticCorpus(n=SYNTHETIC_WORDS, size=SYNTHETIC_SIZE, seed=SYNTHETIC_SEED):
+    rand = random.Random(seed)
+    return [''.join(rand.choice(CHEMICAL_SYMBOLS) for i in range(rand.randint(*size))).lower() for w in range(n)]
+
+
+# Núcleo do chemical num modo (first, all, count ou top:K), opcionalmente com a partilha de prefixos (-s)
+def runChemical(words, mode, shared=False):
+    lines = [w + '\n' for w in words]
+    allMatches = mode == 'all'
+    countOnly = mode == 'count'
+    top = int(mode.split(':')[1]) if mode.startswith('top:') else 0
+    return lambda: processLines(lines, None, allMatches, countOnly, top, shared)
+
+
+# Núcleo do chemicalPlot: contagem das ocorrências dos elementos nas composições das palavras
+def runPlot(words):
+    return lambda: countOccurrences(words)
+
+
+# Núcleo do chemicalLatex (modo por omissão, sem pesquisa de fórmulas no pubchem): processamento de cada palavra,
+# com uma cache de composições e uma memória das representações das palavras novas em cada execução
+def runLatex(words, ptable):
+    def run():
+        fout = io.StringIO()
+        cache = openCache(None)
+        memo = OrderedDict()
+        for word in words:
+            processWord(word, True, True, TRIE_CS, FORMULA_TRIE_CS, ptable, {}, [], fout, cache, {}, memo=memo)
+            fout.write(' ')
+        return fout.getvalue()
+    return run
+
+
+# Medir uma função: melhor tempo de várias execuções e pico de memória alocada numa execução adicional
+def measure(run, repeats):
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return min(times), peak
+
+
+# Obter a lista de benchmarks (nome, nº de palavras e função a medir)
+def getBenchmarks():
+    corpora = [(os.path.basename(f).rsplit('.', 1)[0], loadCorpus(f)) for f in CORPORA]
+    corpora.append(('synthetic', syntheticCorpus()))
+    ptable = loadPeriodicTable(os.path.join(BASEDIR, 'resources', 'periodic_table.info'))
+
+    benchmarks = []
+    for name, words in corpora:
+        for mode in ['first', 'all', 'count', 'top:3']:
+            benchmarks.append(('chemical/' + mode + '/' + name, len(words), runChemical(words, mode)))
+        benchmarks.append(('chemical/sorted/' + name, len(words), runChemical(sorted(words), 'first', shared=True)))
+        benchmarks.append(('chemicalPlot/' + name, len(words), runPlot(words)))
+        benchmarks.append(('chemicalLatex/' + name, len(words), runLatex(words, ptable)))
+    return benchmarks
+
+
+# Obter a identificação do commit atual (se o código estiver num repositório git)
+def getCommit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASEDIR, capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+# Main
+def main():
+    outputfile, comparefile, repeats, select = processArgs()
+
+    previous = {}
+    if comparefile:
+        fd = open(comparefile)
+        previous = {r['name']: r for r in json.load(fd)['results']}
+        fd.close()
+
+    results = []
+    for name, words, run in getBenchmarks():
+        if select not in name:
+            continue
+        seconds, peak = measure(run, repeats)
+        result = {'name': name, 'words': words, 'seconds': round(seconds, 6),
+                  'words_per_sec': round(words / seconds, 1), 'peak_memory': peak}
+        results.append(result)
+
+        # Imprimir resultado (e variação do nº de palavras por segundo, em relação à execução anterior)
+        line = '{:<32} {:>12.1f} words/s {:>10.1f} KiB'.format(name, result['words_per_sec'], peak / 1024)
+        if name in previous:
+            line += ' {:>+8.1%}'.format(result['words_per_sec'] / previous[name]['words_per_sec'] - 1)
+        print(line, file=sys.stderr)
+
+    report = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': getCommit(), 'python': platform.python_version(),
+              'platform': platform.platform(), 'repeats': repeats, 'results': results}
+    fout = sys.stdout if not outputfile else open(outputfile, 'w')
+    json.dump(report, fout, indent=1)
+    fout.write('\n')
+    if outputfile:
+        fout.close()
+
+if __name__ == '__main__':
+    main()
@@ -4,35 +4,74 @@
 
 It receives as input a list of words (one word per line) and generates as output the words that can be
 written as a sequence of chemical symbols, as well as the various possible matches (only first if -a
-option not inserted).
+option not inserted). With -c only the number of possible matches is written and with -t only the first k
+matches are generated. With -s the input is taken as a sorted word list (e.g. a dictionary), and the matching
+of the prefix each word shares with the previous one is reused (for the first or the first k matches; with -a
+alone, only the paths that reach the end of each word are followed, as without -s).
 """
 
-import re
-import regex
+import os
 import sys
+import time
 import getopt
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool, freeze_support
+from compositionCache import DEFAULT_PATH, openCache, takePending, storeResults, closeCache
+from chemicalCore import processWords
+
+# Tamanho do buffer de escrita, nº de linhas de cada bloco de input (também a periodicidade, em palavras, da
+# impressão do progresso) e periodicidade em segundos da impressão do progresso
+OUTPUT_BUFFER = 1 << 16
+CHUNK_SIZE = 1000
+PROGRESS_INTERVAL = 0.5
+
+# Estado de cada processo do pool do modo paralelo (inicializado uma única vez por processo)
+_worker = {}
 
 # Processar argumentos do comando
 def processArgs():
     inputfile = ''
     outputfile = ''
     allMatches = False
+    countOnly = False
+    top = 0
+    cachepath = DEFAULT_PATH
+    jobs = 1
+    shared = False
+    usage = 'chemical [-a | -c | -t <k>] [-s] [-j <jobs>] [--nocache] [-i <inputfile>] [-o <outputfile>]'
 
     # Processar opções/argumentos do comando utilizado
     try: 
-        opts, args = getopt.getopt(sys.argv[1:],"i:o:hva",["ifile=","ofile=","help","version","all"])
+        opts, args = getopt.getopt(sys.argv[1:],"i:o:hvact:j:s",["ifile=","ofile=","help","version","all","count","top=","jobs=","sorted","nocache"])
     except getopt.GetoptError:
-        print('chemical [-a] [-i <inputfile>] [-o <outputfile>]')
+        print(usage)
         sys.exit(2)
     for opt, arg in opts:
         if opt in ('-h', '--help'):
-            print('chemical [-a] [-i <inputfile>] [-o <outputfile>]')
+            print(usage)
             sys.exit()
         elif opt in ('-v', '--version'):
             print('Version 1.0')
             sys.exit()
         elif opt in ("-a", "--all"):
             allMatches = True
+        elif opt in ("-c", "--count"):
+            countOnly = True
+        elif opt in ("-t", "--top"):
+            if not arg.isdigit() or int(arg) == 0:
+                print(usage)
+                sys.exit(2)
+            top = int(arg)
+        elif opt in ("-j", "--jobs"):
+            if not arg.isdigit() or int(arg) == 0:
+                print(usage)
+                sys.exit(2)
+            jobs = int(arg)
+        elif opt in ("-s", "--sorted"):
+            shared = True
+        elif opt == "--nocache":
+            cachepath = None
         elif opt in ("-i", "--ifile"):
             inputfile = arg
         elif opt in ("-o", "--ofile"):
@@ -40,116 +79,96 @@ def processArgs():
 
     # Definir input e output
     fin = sys.stdin if not inputfile else open(inputfile, 'r')
-    fout = sys.stdout if not outputfile else open(outputfile, 'w')
-
-    return fin, fout, allMatches
-
-
-# Remover acentos de uma palavra
-def clean_accents(word):
-    word = re.sub(r'[áàãâ]', r'a', word)
-    word = re.sub(r'[ÁÀÃÂ]', r'A', word)
-    word = re.sub(r'[éèê]', r'e', word)
-    word = re.sub(r'[ÉÈÊ]', r'E', word)
-    word = re.sub(r'[íìî]', r'i', word)
-    word = re.sub(r'[ÍÌÎ]', r'I', word)
-    word = re.sub(r'[óòõô]', r'o', word)
-    word = re.sub(r'[ÓÒÕÔ]', r'O', word)
-    word = re.sub(r'[úùû]', r'u', word)
-    word = re.sub(r'[ÚÙÛ]', r'U', word)
-    return word
-
-
-# Obter o elemento correspondente a um símbolo encontrado (sensitive case)
-def getElement(s, symbols):
-    for symb in symbols:
-        if s.lower() == symb.lower():
-            return symb
-    return s
-
-
-# Obter a expressão regular que seleciona palavras que apenas são formadas com símbolos químicos, excluindo
-# alguns em determinadas posições, indicados no dicionário passado como patâmetro
-def builtPattern(chemical_symbols, to_remove):
-    # Definição do início do resultado e padrão normal (com todos os elementos químicos)
-    r = r'^'
-    usualPattern = '|'.join(chemical_symbols)
-    currentIndex = 0
-
-    # Percorrer todos os pares (índice, elementos) a remover, ordenados por índice
-    for index, elems in sorted(to_remove.items()):
-        # Se índice com elementos a remover for superior ao atual, preenche-se o espaço intermédio com
-        # o padrão normal
-        if currentIndex < index:
-            r += r'(?P<elem>' + usualPattern + r'){' + str(index-currentIndex) + r'}'
-        # Indica-se elementos a considerar na posição index
-        r += r'(?P<elem>' + '|'.join([e for e in chemical_symbols if e not in elems]) + r')'
-        # Atualiza-se a variável do índice atual
-        currentIndex = index + 1
-    
-    # Se resultado já tem algum elemento químico, repete-se o padrão normal 0 ou mais vezes
-    if currentIndex > 0:
-        r += r'(?P<elem>' + usualPattern + r')*$'
-    # Se resultado não tem nenhum elemento químico, repete-se o padrão normal 1 ou mais vezes
-    else:
-        r += r'(?P<elem>' + usualPattern + r')+$'
+    fout = sys.stdout if not outputfile else open(outputfile, 'w', buffering=OUTPUT_BUFFER)
+
+    return fin, fout, allMatches, countOnly, top, cachepath, jobs, shared
+
+
+# Gerar o output de um bloco de linhas do input (uma palavra por linha). Com shared (input ordenado, p.e. um
+# dicionário), o cálculo das composições de cada palavra reaproveita o do prefixo comum com a palavra anterior
+def processLines(lines, cache, allMatches, countOnly, top, shared=False):
+    output = []
+    for word, result in processWords((line.rstrip() for line in lines), allMatches, countOnly, top, cache, shared):
+        if result and countOnly:
+            output.append(word + ": " + str(result) + "\n")
+        elif result:
+            output.append(word + ": " + " | ".join(["+".join(c) for c in result]) + "\n")
+    return ''.join(output)
+
 
-    return r
+# Dividir o input em blocos de CHUNK_SIZE linhas, lidos à medida que são necessários
+def iterChunks(fin):
+    return iter(lambda: list(islice(fin, CHUNK_SIZE)), [])
 
 
-# Obter (todas) as combinações possíveis de símbolos químicos, para a formação da palavra indicada
-def getMatches(word, allMatches, chemical_symbols, precedents = {}):
-    # Inicializar resultado e expressão regular a utilizar
-    r = set()
-    pattern = builtPattern(chemical_symbols, precedents)
-    # Procurar match com o padrão indicado na palavra fornecida
-    match = regex.match(pattern, word, flags=regex.IGNORECASE)
+# Processar o input no próprio processo, gerando, para cada bloco, o output, o nº de linhas e os resultados a
+# guardar na cache (já tratados pela própria cache)
+def processSequential(fin, cache, allMatches, countOnly, top, shared=False):
+    for chunk in iterChunks(fin):
+        yield processLines(chunk, cache, allMatches, countOnly, top, shared), len(chunk), []
 
-    if match:
-        # Obter elementos químicos que compõem a palavra, ordenados, e adicioná-los ao resultado
-        composition = list(map(lambda s: getElement(s, chemical_symbols), match.captures(1)))
-        r.add(tuple(composition))
-        if allMatches:
-            # Para cada elemento da composição da palavra, procura-se matches alternativos sem esse elemento
-            # nessa posição
-            for index, elem in enumerate(composition):
-                prec = precedents.copy()
-                if index in prec:
-                    prec[index].append(elem)
-                else:
-                    prec[index] = [elem]
-                r.update(getMatches(word, allMatches, chemical_symbols, prec))
 
-    return r
+# Inicializar um processo do pool (modo de match e cache apenas para leitura)
+def initWorker(allMatches, countOnly, top, cachepath, shared=False):
+    _worker['cache'] = openCache(cachepath, readOnly=True)
+    _worker['settings'] = (allMatches, countOnly, top, shared)
+
+
+# Processar um bloco de linhas num processo do pool, devolvendo o output e os resultados calculados de novo
+def processChunk(lines):
+    output = processLines(lines, _worker['cache'], *_worker['settings'])
+    return output, len(lines), takePending(_worker['cache'])
+
+
+# Processar o input com um pool de processos, gerando o output de cada bloco pela ordem do input. Apenas são
+# distribuídos 2 blocos por processo de cada vez, de forma a que o input continue a ser lido à medida do necessário
+def processParallel(fin, jobs, settings):
+    with Pool(jobs, initWorker, settings) as pool:
+        running = deque()
+        for chunk in iterChunks(fin):
+            running.append(pool.apply_async(processChunk, (chunk,)))
+            if len(running) >= 2 * jobs:
+                yield running.popleft().get()
+        while running:
+            yield running.popleft().get()
 
 
 # Main
 def main ():
     # Processamento de argumentos do comando utilizado
-    fin, fout, allMatches = processArgs()  
+    fin, fout, allMatches, countOnly, top, cachepath, jobs, shared = processArgs()  
 
-    # Definição dos elementos químicos
-    chemical_symbols = ['H', 'He', 'Li', 'Be', 'B', 'C', 'N', 'O', 'F', 'Ne', 'Na', 'Mg', 'Al', 'Si', 'P', 'S', 'Cl', 'Ar', 'K', 'Ca', 'Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe', 'Co', 'Ni', 'Cu', 'Zn', 'Ga', 'Ge', 'As', 'Se', 'Br', 'Kr', 'Rb', 'Sr', 'Y', 'Zr', 'Nb', 'Mo', 'Tc', 'Ru', 'Rh', 'Pd', 'Ag', 'Cd', 'In', 'Sn', 'Sb', 'Te', 'I', 'Xe', 'Cs', 'Ba', 'La', 'Ce', 'Pr', 'Nd', 'Pm', 'Sm', 'Eu', 'Gd', 'Tb', 'Dy', 'Ho', 'Er', 'Tm', 'Yb', 'Lu', 'Hf', 'Ta', 'W', 'Re', 'Os', 'Ir', 'Pt', 'Au', 'Hg', 'Tl', 'Pb', 'Bi', 'Po', 'At', 'Rn', 'Fr', 'Ra', 'Ac', 'Th', 'Pa', 'U', 'Np', 'Pu', 'Am', 'Cm', 'Bk', 'Cf', 'Es', 'Fm', 'Md', 'No', 'Lr', 'Rf', 'Db', 'Sg', 'Bh', 'Hs', 'Mt', 'Ds', 'Rg', 'Cn', 'Nh', 'Fl', 'Mc', 'Lv', 'Ts', 'Og']
-    
-    # Definição da expressão regular a fazer match
-    pattern = r'^(' + '|'.join(chemical_symbols) + ')+$'
+    # Abertura da cache de composições
+    cache = openCache(cachepath)
 
-    content = fin.readlines()
+    # Processar input com uma palavra por linha, em blocos lidos à medida do necessário (no próprio processo ou
+    # num pool de processos), e escrever o output pela ordem do input. O nº de palavras processadas é impresso no
+    # máximo a cada PROGRESS_INTERVAL segundos
+    if jobs > 1:
+        results = processParallel(fin, jobs, (allMatches, countOnly, top, cachepath, shared))
+    else:
+        results = processSequential(fin, cache, allMatches, countOnly, top, shared)
     current_word = 0
-    total_words = len(content)
-    # Processar input com uma palavra por linha e gerar output dos matches
-    for line in content:
-        print('Processed ' + str(current_word) + '/' + str(total_words), file=sys.stderr, end='\r')
-        word = line.rstrip()
-        word_no_acc = clean_accents(word)
-        if re.search(pattern, word_no_acc, re.IGNORECASE):
-            compositions = getMatches(word_no_acc, allMatches, chemical_symbols)
-            fout.write(word + ": " + " | ".join(["+".join(c) for c in compositions]) + "\n")
-        current_word += 1
-
-    # Fechar ficheiros abertos
+    last_progress = 0
+    try:
+        for output, lines, computed in results:
+            fout.write(output)
+            storeResults(cache, computed)
+            current_word += lines
+            if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                last_progress = time.monotonic()
+                print('Processed ' + str(current_word), file=sys.stderr, end='\r')
+        print('Processed ' + str(current_word), file=sys.stderr, end='\r')
+    except BrokenPipeError:
+        # Output fechado pelo processo seguinte da pipeline (p.e. head): descarta-se o resto do output
+        os.dup2(os.open(os.devnull, os.O_WRONLY), fout.fileno())
+    results.close()
+
+    # Fechar cache e ficheiros abertos
+    closeCache(cache)
     fin.close()
     fout.close()
 
-main()
-
+if __name__ == '__main__':
+    freeze_support()
+    main()
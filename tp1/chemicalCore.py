@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+
+"""Core shared by the chemical tools: chemical symbols, accent folding and segmentation of words.
+
+The symbol tries used to segment words are built once, at import, and words are folded with a single
+translation table. Besides the per-word functions, it offers processWords, which segments an iterable of
+words (optionally through the composition cache).
+"""
+
+from itertools import islice
+from compositionCache import getComposition
+
+# Definição dos elementos químicos (por ordem de nº atómico) e dos símbolos que podem formar uma fórmula química
+CHEMICAL_SYMBOLS = ['H', 'He', 'Li', 'Be', 'B', 'C', 'N', 'O', 'F', 'Ne', 'Na', 'Mg', 'Al', 'Si', 'P', 'S', 'Cl', 'Ar', 'K', 'Ca', 'Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe', 'Co', 'Ni', 'Cu', 'Zn', 'Ga', 'Ge', 'As', 'Se', 'Br', 'Kr', 'Rb', 'Sr', 'Y', 'Zr', 'Nb', 'Mo', 'Tc', 'Ru', 'Rh', 'Pd', 'Ag', 'Cd', 'In', 'Sn', 'Sb', 'Te', 'I', 'Xe', 'Cs', 'Ba', 'La', 'Ce', 'Pr', 'Nd', 'Pm', 'Sm', 'Eu', 'Gd', 'Tb', 'Dy', 'Ho', 'Er', 'Tm', 'Yb', 'Lu', 'Hf', 'Ta', 'W', 'Re', 'Os', 'Ir', 'Pt', 'Au', 'Hg', 'Tl', 'Pb', 'Bi', 'Po', 'At', 'Rn', 'Fr', 'Ra', 'Ac', 'Th', 'Pa', 'U', 'Np', 'Pu', 'Am', 'Cm', 'Bk', 'Cf', 'Es', 'Fm', 'Md', 'No', 'Lr', 'Rf', 'Db', 'Sg', 'Bh', 'Hs', 'Mt', 'Ds', 'Rg', 'Cn', 'Nh', 'Fl', 'Mc', 'Lv', 'Ts', 'Og']
+FORMULA_SYMBOLS = CHEMICAL_SYMBOLS + [str(d) for d in range(10)]
+
+# Tabela de remoção de acentos
+ACCENTS_TABLE = str.maketrans('áàãâÁÀÃÂéèêÉÈÊíìîÍÌÎóòõôÓÒÕÔúùûÚÙÛ', 'aaaaAAAAeeeEEEiiiIIIooooOOOOuuuUUU')
+
+
+# Remover acentos de uma palavra
+def clean_accents(word):
+    return word.translate(ACCENTS_TABLE)
+
+
+# Construir uma trie com os símbolos químicos, em que cada nodo guarda na chave '' o símbolo que aí termina,
+# juntamente com o seu índice na lista de símbolos (ordem pela qual as alternativas são consideradas)
+def buildTrie(chemical_symbols, ignoreCase=True):
+    trie = {}
+    for index, symb in enumerate(chemical_symbols):
+        node = trie
+        for char in (symb.lower() if ignoreCase else symb):
+            node = node.setdefault(char, {})
+        node[''] = (index, symb)
+    return trie
+
+
+# Obter, para cada posição da palavra, os símbolos químicos que aí começam e que levam a uma composição completa
+# da palavra, bem como a posição onde terminam. A programação dinâmica é feita do fim para o início da palavra,
+# pelo que cada posição é analisada uma única vez. Caso a palavra não possa ser composta, devolve-se None
+def getEdges(word, trie, ignoreCase=True):
+    if ignoreCase:
+        word = word.lower()
+    n = len(word)
+    reachable = [False] * n + [True]
+    edges = [None] * n
+
+    for start in range(n - 1, -1, -1):
+        found = []
+        node = trie
+        end = start
+        # Percorrer a trie a partir da posição atual, recolhendo os símbolos cujo fim é alcançável
+        while end < n and word[end] in node:
+            node = node[word[end]]
+            end += 1
+            if '' in node and reachable[end]:
+                found.append(node[''] + (end,))
+        # Ordenar os símbolos pela ordem da lista de símbolos (mesma ordem das alternativas da expressão regular)
+        found.sort()
+        edges[start] = [(symb, end) for _, symb, end in found]
+        reachable[start] = len(found) > 0
+
+    return edges if n > 0 and reachable[0] else None
+
+
+# Gerar, de forma preguiçosa, as combinações de símbolos químicos que formam a palavra, pela mesma ordem em que
+# seriam encontradas pela expressão regular (a primeira combinação gerada é o match da expressão regular)
+def iterCompositions(word, trie, ignoreCase=True):
+    edges = getEdges(word, trie, ignoreCase)
+    if not edges:
+        return
+
+    n = len(word)
+    path = []
+    iterators = [iter(edges[0])]
+    # Percorrer em profundidade apenas os caminhos que levam ao fim da palavra
+    while iterators:
+        step = next(iterators[-1], None)
+        if step is None:
+            iterators.pop()
+            if path:
+                path.pop()
+            continue
+        symb, end = step
+        path.append(symb)
+        if end == n:
+            yield tuple(path)
+            path.pop()
+        else:
+            iterators.append(iter(edges[end]))
+
+
+# Contar o nº de combinações de símbolos químicos que formam a palavra, sem as gerar. Cada posição guarda o nº de
+# combinações possíveis para o resto da palavra, calculado do fim para o início a partir das arestas do getEdges
+def countCompositions(word, trie, ignoreCase=True):
+    edges = getEdges(word, trie, ignoreCase)
+    if not edges:
+        return 0
+
+    n = len(word)
+    counts = [0] * n + [1]
+    for start in range(n - 1, -1, -1):
+        counts[start] = sum(counts[end] for _, end in edges[start])
+
+    return counts[0]
+
+
+# Obter (todas, ou apenas as primeiras top) as combinações possíveis de símbolos químicos, para a formação da
+# palavra indicada
+def getMatches(word, allMatches, trie, top=0, ignoreCase=True):
+    compositions = iterCompositions(word, trie, ignoreCase)
+    if top:
+        return list(islice(compositions, top))
+    return list(compositions) if allMatches else list(islice(compositions, 1))
+
+
+# Obter uma função que calcula as composições de uma palavra (as primeiras top ou a primeira, como getMatches),
+# com programação dinâmica do início para o fim da palavra: o estado de cada posição (as primeiras composições do
+# prefixo até essa posição) depende apenas desse prefixo, pelo que os estados do prefixo comum com a palavra
+# anterior são reaproveitados. Numa lista de palavras ordenada (p.e. um dicionário), as palavras com o mesmo prefixo
+# partilham assim grande parte do trabalho. As composições de cada prefixo são comparadas pelos índices dos seus
+# símbolos, que é a ordem pela qual são geradas por iterCompositions. Não é usada para obter todas as composições:
+# o estado de cada prefixo teria todas as suas composições, mesmo as que não levam ao fim da palavra (em nº
+# exponencial no tamanho do prefixo), que só a programação dinâmica do fim para o início do getEdges exclui
+def getPrefixMatcher(chemical_symbols, top=0):
+    symbols = {symb.lower(): index for index, symb in enumerate(chemical_symbols)}
+    lengths = range(1, max(len(symb) for symb in symbols) + 1)
+    limit = top or 1
+    last = {'word': '', 'states': [[()]]}
+
+    def compute(word):
+        prev = last['word']
+        states = last['states']
+        n = len(word)
+        shared = 0
+        while shared < len(prev) and shared < n and prev[shared] == word[shared]:
+            shared += 1
+        del states[shared + 1:]
+
+        for end in range(shared + 1, n + 1):
+            steps = []
+            for length in lengths:
+                if length <= end and states[end - length]:
+                    index = symbols.get(word[end - length:end])
+                    if index is not None:
+                        steps.append((states[end - length], index))
+            # Se nenhuma das últimas posições é alcançável, nenhuma das seguintes o é
+            if not steps and not any(states[max(0, end - len(lengths)):end]):
+                states.extend([[]] * (n + 1 - end))
+                break
+            if limit == 1:
+                states.append([min(previous[0] + (index,) for previous, index in steps)] if steps else [])
+            else:
+                paths = sorted(path + (index,) for previous, index in steps for path in previous)
+                states.append(paths[:limit])
+        last['word'] = word
+
+        return [tuple(chemical_symbols[index] for index in path) for path in states[-1]] if word else []
+
+    return compute
+
+
+# Obter o modo de match (parte da chave da cache) e a função que calcula o resultado de uma palavra nesse modo
+def getMode(trie, allMatches=False, countOnly=False, top=0):
+    if countOnly:
+        return 'count', lambda w: countCompositions(w, trie)
+    mode = 'top:' + str(top) if top else 'all' if allMatches else 'first'
+    return mode, lambda w: getMatches(w, allMatches, trie, top)
+
+
+# Obter, para cada palavra de um iterável, a palavra e o seu resultado no modo indicado (composições, ou nº de
+# composições), sem acentos nem distinção entre maiúsculas e minúsculas e, se indicada, através da cache. Com
+# shared, a primeira (ou as primeiras top) composições são calculadas reaproveitando o prefixo comum com a palavra
+# anterior (para listas de palavras ordenadas; a contagem e a geração de todas as composições, que seguem apenas
+# os caminhos que levam ao fim da palavra, não mudam)
+def processWords(words, allMatches=False, countOnly=False, top=0, cache=None, shared=False):
+    mode, compute = getMode(TRIE, allMatches, countOnly, top)
+    if shared and not countOnly and (top or not allMatches):
+        compute = getPrefixMatcher(CHEMICAL_SYMBOLS, top)
+    for word in words:
+        word_no_acc = clean_accents(word).lower()
+        yield word, getComposition(cache, word_no_acc, mode, compute) if cache else compute(word_no_acc)
+
+
+# Tries dos símbolos químicos e dos símbolos das fórmulas, com e sem distinção entre maiúsculas e minúsculas
+TRIE = buildTrie(CHEMICAL_SYMBOLS)
+TRIE_CS = buildTrie(CHEMICAL_SYMBOLS, ignoreCase=False)
+FORMULA_TRIE = buildTrie(FORMULA_SYMBOLS)
+FORMULA_TRIE_CS = buildTrie(FORMULA_SYMBOLS, ignoreCase=False)
@@ -11,13 +11,40 @@ the chemical elements of the text or the periodic table).
 """
 
 import re
-import regex
 import sys
+import time
 import os.path
 import getopt
-import pubchempy as pcp
-from itertools import groupby
+import shutil
+import tempfile
+from itertools import groupby, islice
+from collections import OrderedDict, deque
+from multiprocessing import Pool, freeze_support
 from printChemLatex import *
+from periodicTable import loadPeriodicTable
+from spectralImages import syncSpectralImages
+from compositionCache import DEFAULT_PATH, openCache, getComposition, takePending, storeResults, closeCache
+from pubchemCache import DEFAULT_PATH as PUBCHEM_PATH, DEFAULT_TTL, openFormulaCache, getFormulaInfo, \
+                         storeFormulaInfo, closeFormulaCache
+from chemicalCore import clean_accents, getMatches, TRIE, TRIE_CS, FORMULA_TRIE, FORMULA_TRIE_CS
+
+# Nº de pesquisas no pubchem feitas em simultâneo
+LOOKUPS = 4
+
+# Tamanho do buffer de escrita, nº de caracteres de cada bloco lido do input e periodicidade em segundos da
+# impressão do progresso
+OUTPUT_BUFFER = 1 << 16
+CHUNK_SIZE = 1 << 16
+PROGRESS_INTERVAL = 0.5
+
+# Nº máximo de palavras distintas cuja representação é memorizada durante a geração de um documento
+MEMO_SIZE = 50000
+
+# Nº de partes do texto de cada bloco segmentado por um processo do pool, no modo paralelo
+JOB_CHUNK = 5000
+
+# Estado de cada processo do pool do modo paralelo (inicializado uma única vez por processo)
+_worker = {}
 
 
 # Processar argumentos do comando
@@ -26,20 +53,28 @@ def processArgs():
     outputfile = ''
     partial = True
     formulas = True
+    compact = False
+    sparse = False
+    cachepath = DEFAULT_PATH
+    pubchempath = PUBCHEM_PATH
+    ttl = DEFAULT_TTL
+    offline = False
+    lookups = LOOKUPS
+    pubchemurl = None
+    jobs = 1
+    usage = 'Chemical Latex Generator\n' + \
+            'Usage:\n\tchemicalLatex [-a] [-n] [-c] [-s] [-j <jobs>] [--nocache] [--offline] [--ttl <days>] [--pubchem <url>] [--lookups <n>] [-i <inputfile>] [-o <outputfile>]\n' + \
+            'Options:\n\t-a | --all\t\tProcess all words that match, ignoring letter case and accents\n\t-n | --noformulas\tDoesn\'t match formulas, nor does it show its information\n\t-c | --compact\t\tDefines each chemical element once, as a latex macro, producing a smaller latex file\n\t-s | --sparse\t\tOnly shows detailed information about the chemical elements found, the others are listed in a compact table\n\t-j | --jobs\t\tUsed to indicate the number of processes that find the chemical elements and formulas of the words (default 1)\n\t--nocache\t\tDoesn\'t use the persistent caches of compositions and PubChem searches\n\t--offline\t\tDoesn\'t search PubChem nor download spectral images, only uses the information already cached\n\t--ttl\t\t\tUsed to indicate the number of days PubChem searches stay cached (default 30)\n\t--pubchem\t\tUsed to indicate the URL of the PubChem REST API (e.g. a local stand-in server)\n\t--lookups\t\tUsed to indicate the number of concurrent PubChem searches (default 4)\n\t-i | --ifile\t\tUsed to indicate input file\n\t-o | --ofile\t\tUsed to indicate output file'
 
     # Processa-se opções/argumentos do comando utilizado
     try: 
-        opts, args = getopt.getopt(sys.argv[1:],'i:o:hvan',['ifile=','ofile=','help','version','all','noformulas'])
+        opts, args = getopt.getopt(sys.argv[1:],'i:o:hvancsj:',['ifile=','ofile=','help','version','all','noformulas','compact','sparse','jobs=','nocache','offline','ttl=','pubchem=','lookups='])
     except getopt.GetoptError:
-        print('Chemical Latex Generator\n' +
-              'Usage:\n\tchemicalLatex [-a] [-n] [-i <inputfile>] [-o <outputfile>]\n' +
-              'Options:\n\t-a | --all\t\tProcess all words that match, ignoring letter case and accents\n\t-n | --noformulas\tDoesn\'t match formulas, nor does it show its information\n\t-i | --ifile\t\tUsed to indicate input file\n\t-o | --ofile\t\tUsed to indicate output file')
+        print(usage)
         sys.exit(2)
     for opt, arg in opts:
         if opt in ('-h', '--help'):
-            print('Chemical Latex Generator\n' +
-                  'Usage:\n\tchemicalLatex [-a] [-n] [-i <inputfile>] [-o <outputfile>]\n' +
-                  'Options:\n\t-a | --all\t\tProcess all words that match, ignoring letter case and accents\n\t-n | --noformulas\tDoesn\'t match formulas, nor does it show its information\n\t-i | --ifile\t\tUsed to indicate input file\n\t-o | --ofile\t\tUsed to indicate output file')
+            print(usage)
             sys.exit()
         elif opt in ('-v', '--version'):
             print('Version 1.0')
@@ -48,6 +83,33 @@ def processArgs():
             partial = False
         elif opt in ('-n', '--noformulas'):
             formulas = False
+        elif opt in ('-c', '--compact'):
+            compact = True
+        elif opt in ('-s', '--sparse'):
+            sparse = True
+        elif opt in ('-j', '--jobs'):
+            if not arg.isdigit() or int(arg) == 0:
+                print(usage)
+                sys.exit(2)
+            jobs = int(arg)
+        elif opt == '--nocache':
+            cachepath = None
+            pubchempath = None
+        elif opt == '--offline':
+            offline = True
+        elif opt == '--ttl':
+            try:
+                ttl = float(arg) * 24 * 60 * 60
+            except ValueError:
+                print(usage)
+                sys.exit(2)
+        elif opt == '--pubchem':
+            pubchemurl = arg
+        elif opt == '--lookups':
+            if not arg.isdigit() or int(arg) == 0:
+                print(usage)
+                sys.exit(2)
+            lookups = int(arg)
         elif opt in ('-i', '--ifile'):
             inputfile = arg
         elif opt in ('-o', '--ofile'):
@@ -60,7 +122,7 @@ def processArgs():
         fout = sys.stdout
         outputdir = '.' 
     else:
-        fout = open(outputfile, 'w')
+        fout = open(outputfile, 'w', buffering=OUTPUT_BUFFER)
         if '/' in outputfile:
             outputdir = outputfile.rpartition('/')[0]
         else:
@@ -78,78 +140,39 @@ def processArgs():
                   'Error: No file \'Resources\' found')
         sys.exit(3)
 
-    return fin, fout, resourcespath, partial, formulas
-
-
-# Remover acentos de uma palavra
-def clean_accents(word):
-    word = re.sub(r'[áàãâ]', r'a', word)
-    word = re.sub(r'[ÁÀÃÂ]', r'A', word)
-    word = re.sub(r'[éèê]', r'e', word)
-    word = re.sub(r'[ÉÈÊ]', r'E', word)
-    word = re.sub(r'[íìî]', r'i', word)
-    word = re.sub(r'[ÍÌÎ]', r'I', word)
-    word = re.sub(r'[óòõô]', r'o', word)
-    word = re.sub(r'[ÓÒÕÔ]', r'O', word)
-    word = re.sub(r'[úùû]', r'u', word)
-    word = re.sub(r'[ÚÙÛ]', r'U', word)
-    return word
-
-
-# Obter um atributo dum elemento químico que é especificado como texto, com uma estrutura específica 
-def getElemAttribute(element, attribute):
-    l = re.findall(attribute + r': (.+)\n', element)
-    if len(l)==0: r = None
-    else: r = l[0]
-    return r
-
-
-# Obter a informação da tabela periódica e respetivos elementos químicos a partir de um ficheiro, cujo
-# conteúdo deve seguir uma estrutura específica
-def getPeriodicTableInfo(filename):
-    fd = open(filename)
-    content = fd.read()
-    fd.close()
-
-    periodic_table = {}
-    info = re.findall(r'\{([^}]*)\}', content)
-
-    for element in info:
-        symbol = getElemAttribute(element, 'symbol')
-        periodic_table[symbol.lower()] = {
-            'name': getElemAttribute(element, 'name'),
-            'appearance': getElemAttribute(element, 'appearance'),
-            'mass': getElemAttribute(element, 'atomic_mass'),
-            'category': getElemAttribute(element, 'category'),
-            'density': getElemAttribute(element, 'density'),
-            'number': getElemAttribute(element, 'number'),
-            'period': getElemAttribute(element, 'period'),
-            'phase': getElemAttribute(element, 'phase'),
-            'spectral_img': getElemAttribute(element, 'spectral_img'),
-            'summary': getElemAttribute(element, 'summary'),
-            'symbol': symbol,
-            'xpos': getElemAttribute(element, 'xpos'),
-            'ypos': getElemAttribute(element, 'ypos'),
-            'relative_position': getElemAttribute(element, 'relative_position'),
-            'occurrences': 0
-        }
-        if not periodic_table[symbol.lower()]['relative_position']:
-            periodic_table[symbol.lower()]['relative_position'] = ''
-        else:
-            periodic_table[symbol.lower()]['relative_position'] += ', '
+    return fin, fout, resourcespath, partial, formulas, compact, sparse, cachepath, pubchempath, ttl, offline, pubchemurl, lookups, jobs
+
+
+# Dividir o texto de input em partes (palavras e separadores), lendo-o em blocos de CHUNK_SIZE caracteres. A
+# última parte de cada bloco pode continuar no bloco seguinte, pelo que só é devolvida juntamente com este
+def iterTokens(fin, chunksize=CHUNK_SIZE):
+    rest = ''
+    for chunk in iter(lambda: fin.read(chunksize), ''):
+        tokens = re.findall(r'\w+|\W+', rest + chunk)
+        rest = tokens.pop()
+        yield from tokens
+    if rest:
+        yield rest
+
 
-    return dict(sorted(periodic_table.items(), key = lambda e: float(e[1]['number'])))
+# Obter o input numa forma que possa ser lida mais do que uma vez: se não for possível voltar ao início (p.e. numa
+# pipe), o input é copiado para um ficheiro temporário
+def getRewindable(fin):
+    if fin.seekable():
+        return fin
+    spool = tempfile.TemporaryFile('w+')
+    shutil.copyfileobj(fin, spool)
+    spool.seek(0)
+    return spool
 
 
-# Pesquisar fórmula no pubchem e obter respetivas informações
-def searchFormulaInfo(formula):
+# Obter o texto com as informações dos compostos do pubchem que correspondem a uma fórmula
+def formatFormulaInfo(compounds):
     info = ''
-    cids = set(pcp.get_cids(formula, 'name')).intersection(pcp.get_cids(formula, 'formula'))
 
-    for cid in cids:
-        c = pcp.Compound.from_cid(cid)
-        name = c.iupac_name
-        altNames = c.synonyms[:4]
+    for c in compounds:
+        name = c['iupac_name']
+        altNames = c['synonyms'][:4]
 
         if not name and len(altNames) > 0:
             name = altNames[0]
@@ -158,100 +181,284 @@ def searchFormulaInfo(formula):
 
         if name: 
             info += 'This formula has the IUPAC name \\textbf{' + name + '}'
-            if c.molecular_formula: info += ' and the molecular formula \\textbf{' + c.molecular_formula + '}'
+            if c['molecular_formula']: info += ' and the molecular formula \\textbf{' + c['molecular_formula'] + '}'
             info += '. '
         if len(altNames) > 1:
             info +=  'Some alternative names are ' + ', '.join(str(n) for n in altNames[:-1]) + ' and ' + altNames[-1] + '. '
         elif len(altNames) == 1:
             info +=  'An alternative name is ' + altNames[0] + '. '
-        if c.complexity: info += 'Its complexity has value ' + str(c.complexity) + '. '
-        if c.exact_mass: info += 'The exact mass is ' + str(c.exact_mass) + '. '
-        if c.molecular_weight: info += 'The molecular weight is ' + str(c.molecular_weight) + '. '
-        if c.monoisotopic_mass: info += 'The monoisotopic mass is ' + str(c.monoisotopic_mass) + '. '
+        if c['complexity']: info += 'Its complexity has value ' + str(c['complexity']) + '. '
+        if c['exact_mass']: info += 'The exact mass is ' + str(c['exact_mass']) + '. '
+        if c['molecular_weight']: info += 'The molecular weight is ' + str(c['molecular_weight']) + '. '
+        if c['monoisotopic_mass']: info += 'The monoisotopic mass is ' + str(c['monoisotopic_mass']) + '. '
 
     return info
 
 
-# Pocessar palavra de forma a escrever, caso seja uma composição de elementos químicos, informação sobre esses 
-# elementos e/ou, caso seja uma fórmula, informação sobre a mesma
-def processWord(word, partial, formulas, patternElements, patternFormulas, ptable,
-                                            formulas_found, formulas_not_found, fout):
-    
-    word_clean = clean_accents(word).lower() if not partial else word
-
-    # Escrever sobre elementos químicos encontrados
-    if re.search(patternElements, word_clean, re.IGNORECASE if not partial else 0):
-        composition = regex.match(patternElements, word_clean, flags=regex.IGNORECASE if not partial else 0).captures(1)
-        for symbol in composition:
-            ptable[symbol.lower()]['occurrences'] += 1
-        printChemElements(fout, composition, ptable)
-    else:
-        fout.write(word.replace('_','\_').replace('\n','\n\n'))
+# Obter a palavra na forma em que é comparada com os símbolos químicos (sem acentos nem maiúsculas, caso se
+# processem todas as palavras)
+def cleanWord(word, partial):
+    return clean_accents(word).lower() if not partial else word
 
-    # Escrever sobre fórmulas químicas encontradas
-    if formulas and re.search(patternFormulas, word_clean, re.IGNORECASE if not partial else 0):
-        composition = regex.match(patternFormulas, word_clean, flags=regex.IGNORECASE if not partial else 0).captures(1)
-        composition = list(map(lambda e: ptable[e.lower()]['symbol'] if e.lower() in ptable else e , composition))
-        formula = ''.join([key + str(len(list(group))) for key, group in groupby(composition)]).replace('1','')
-        if formula:
-            # Se fórmula ainda não foi pesquisada, efetua-se a pesquisa e, caso se encontre, apresenta-se informações
-            if not (formula in formulas_found or formula in formulas_not_found):
-                # Pesquisa-se fórmula
-                try:
-                    info = searchFormulaInfo(formula)
-                except pcp.PubChemHTTPError:
-                    info = ''
-
-                # Se se obteve informação, apresenta-se-a numa nota de rodapé e junta-se a fórmula às encontradas
-                if info:
-                    printFoot(fout, 'label', formula, info)
-                    formulas_found[formula] = 1
-                # Se não se obteve informação, junta-se fórmula às não encontradas
-                else:
-                    formulas_not_found.append(formula)
-
-            # Se fórmula já foi pesquisada e encontrada, apenas se insere referência para a nota de rodapé já criada
-            elif formula in formulas_found:
-                printFoot(fout, 'ref', formula)
-                formulas_found[formula] += 1;
 
+# Obter a primeira composição de elementos químicos de uma palavra (já limpa), ou None se não tiver nenhuma
+def getElements(word_clean, partial, trieElements, cache):
+    compositions = getComposition(cache, word_clean, 'first' if not partial else 'first-cs',
+                                  lambda w: getMatches(w, False, trieElements, ignoreCase=not partial))
+    return compositions[0] if compositions else None
 
-# Main
-def main():
-    # Processamento de argumentos do comando utilizado
-    fin, fout, resourcespath, partial, formulas = processArgs()
 
-    # Leitura da informação da tabela periódica e inicialização de variáveis (padrões, conteúdo do input, ...)
-    periodic_table = getPeriodicTableInfo(resourcespath + '/periodic_table.info')
-    chemical_symbols = list(map(lambda e: e['symbol'], periodic_table.values()))
-    patternElements = r'^(' + '|'.join(chemical_symbols) + ')+$'
-    patternFormulas = r'^(' + '|'.join(chemical_symbols + [r'\d']) + ')+$'
-    formulas_found = {}
-    formulas_not_found = []
-    content = re.findall(r'\w+|\W+', fin.read())
-    total_parts = len(content)
-    current_part = 0
+# Obter a fórmula química representada por uma palavra (já limpa), ou texto vazio se não representar nenhuma
+def getFormula(word_clean, partial, trieFormulas, cache):
+    compositions = getComposition(cache, word_clean, 'formula' if not partial else 'formula-cs',
+                                  lambda w: getMatches(w, False, trieFormulas, ignoreCase=not partial))
+    if not compositions:
+        return ''
+    return ''.join([key + str(len(list(group))) for key, group in groupby(compositions[0])]).replace('1','')
 
-    # Escreve-se início do documento
-    printInitDocument(fout, resourcespath)
 
-    # Processa-se o texto de input e escreve-se o output
-    for word in content:
-        # Imprime-se nº de partes processadas no total
-        print('Processed ' + str(current_part) + '/' + str(total_parts), file=sys.stderr, end='\r')
+# Obter a informação de várias fórmulas: as que estão na cache de pesquisas (e não expiraram) são lidas da cache e
+# as restantes são pesquisadas no pubchem de uma só vez (ver pubchemClient, que só é importado se houver fórmulas
+# por pesquisar). Se a pesquisa de uma fórmula falhar, recorre-se ao resultado expirado, caso exista
+def resolveFormulas(formulas, pubchem, pubchemurl=None, lookups=LOOKUPS):
+    resolved = {}
+    missing = []
+    for formula in formulas:
+        info = getFormulaInfo(pubchem, formula)
+        if info is None:
+            missing.append(formula)
+        else:
+            resolved[formula] = info
+
+    searched = {}
+    if missing:
+        from pubchemClient import API_BASE, openSession, searchFormulas, closeSession
+        session = openSession(pubchemurl or API_BASE)
+        searched = searchFormulas(session, missing, lookups)
+        closeSession(session)
+    for formula in missing:
+        if formula in searched:
+            resolved[formula] = formatFormulaInfo(searched[formula])
+            storeFormulaInfo(pubchem, formula, resolved[formula])
+        else:
+            resolved[formula] = getFormulaInfo(pubchem, formula, stale=True)
+
+    return resolved
+
+
+# Obter os símbolos dos elementos químicos que compõem uma palavra (vazio, se não for uma composição) e a fórmula
+# química que representa (texto vazio, se não representar nenhuma)
+def segmentWord(word, partial, formulas, trieElements, trieFormulas, cache):
+    word_clean = cleanWord(word, partial)
+    composition = getElements(word_clean, partial, trieElements, cache)
+    symbols = tuple(symbol.lower() for symbol in composition) if composition else ()
+    formula = getFormula(word_clean, partial, trieFormulas, cache) if formulas else ''
+    return symbols, formula
+
 
-        # Processa-se palavra
-        processWord(word, partial, formulas, patternElements, patternFormulas, 
-                    periodic_table, formulas_found, formulas_not_found, fout)
+# Obter o texto a escrever por uma palavra: nodos dos elementos químicos que a compõem ou a própria palavra
+def renderText(word, symbols, ptable, compact=False):
+    if symbols:
+        return renderChemElements(symbols, ptable, compact)
+    return word.replace('_','\_').replace('\n','\n\n')
 
-        # Incrementa-se o nº de partes processadas
-        current_part += 1
 
-    # Escreve-se fim do documento
-    printEndDocument(fout, resourcespath, periodic_table, formulas_found)
+# Pocessar palavra de forma a escrever, caso seja uma composição de elementos químicos, informação sobre esses 
+# elementos e/ou, caso seja uma fórmula, informação sobre a mesma. A representação da palavra (símbolos, texto e
+# fórmula) é obtida da memória (LRU com MEMO_SIZE palavras), se for indicada e já a contiver, sendo as ocorrências
+# dos elementos e as notas de rodapé das fórmulas sempre atualizadas. Os símbolos e a fórmula da palavra podem ser
+# indicados (segmentation), se já tiverem sido obtidos (p.e. por um processo do pool, no modo paralelo)
+def processWord(word, partial, formulas, trieElements, trieFormulas, ptable,
+                                            formulas_found, formulas_not_found, fout, cache, formulas_info, compact=False,
+                                            memo=None, segmentation=None):
+    key = (word, partial, formulas)
+    rendering = memo.get(key) if memo is not None else None
+    if rendering is None:
+        if segmentation is None:
+            segmentation = segmentWord(word, partial, formulas, trieElements, trieFormulas, cache)
+        symbols, formula = segmentation
+        rendering = (symbols, renderText(word, symbols, ptable, compact), formula)
+        if memo is not None:
+            memo[key] = rendering
+            if len(memo) > MEMO_SIZE:
+                memo.popitem(last=False)
+    else:
+        memo.move_to_end(key)
+    symbols, text, formula = rendering
+
+    # Escrever sobre elementos químicos encontrados (no modo compacto, definindo antes as macros em falta)
+    for symbol in symbols:
+        ptable[symbol]['occurrences'] += 1
+    if compact and symbols:
+        printChemMacros(fout, symbols, ptable)
+    fout.write(text)
 
-    # Fechar ficheiros abertos
+    # Escrever sobre fórmulas químicas encontradas
+    if formula:
+        # Se fórmula ainda não foi apresentada, obtém-se a informação (já pesquisada) e, caso exista, apresenta-se-a
+        if not (formula in formulas_found or formula in formulas_not_found):
+            info = formulas_info.get(formula, '')
+
+            # Se se obteve informação, apresenta-se-a numa nota de rodapé e junta-se a fórmula às encontradas
+            if info:
+                printFoot(fout, 'label', formula, info)
+                formulas_found[formula] = 1
+            # Se não se obteve informação, junta-se fórmula às não encontradas
+            else:
+                formulas_not_found.append(formula)
+
+        # Se fórmula já foi pesquisada e encontrada, apenas se insere referência para a nota de rodapé já criada
+        elif formula in formulas_found:
+            printFoot(fout, 'ref', formula)
+            formulas_found[formula] += 1;
+
+
+# Inicializar um processo do pool (modo de match e cache apenas para leitura)
+def initWorker(partial, formulas, cachepath):
+    _worker['cache'] = openCache(cachepath, readOnly=True)
+    _worker['settings'] = (partial, formulas, TRIE if not partial else TRIE_CS,
+                           FORMULA_TRIE if not partial else FORMULA_TRIE_CS)
+
+
+# Obter, num processo do pool, os símbolos e a fórmula de cada parte distinta de um bloco do texto (apenas a
+# fórmula, com formulasOnly), bem como os resultados calculados de novo, a guardar na cache
+def segmentChunk(words, formulasOnly=False):
+    partial, formulas, trieElements, trieFormulas = _worker['settings']
+    cache = _worker['cache']
+    segmentations = {}
+    for word in words:
+        if word in segmentations:
+            continue
+        if formulasOnly:
+            segmentations[word] = ((), getFormula(cleanWord(word, partial), partial, trieFormulas, cache))
+        else:
+            segmentations[word] = segmentWord(word, partial, formulas, trieElements, trieFormulas, cache)
+    return segmentations, takePending(cache)
+
+
+# Segmentar as partes do texto com um pool de processos, em blocos de JOB_CHUNK partes, gerando cada parte e os
+# seus símbolos e fórmula pela ordem do texto. Apenas são distribuídos 2 blocos por processo de cada vez, de forma
+# a que o texto continue a ser lido à medida do necessário, e os resultados calculados são guardados na cache
+def segmentParallel(pool, jobs, words, cache, formulasOnly=False):
+    running = deque()
+    chunks = iter(lambda: list(islice(words, JOB_CHUNK)), [])
+    for chunk in chunks:
+        running.append((chunk, pool.apply_async(segmentChunk, (chunk, formulasOnly))))
+        if len(running) >= 2 * jobs:
+            yield from emitChunk(running.popleft(), cache)
+    while running:
+        yield from emitChunk(running.popleft(), cache)
+
+
+# Gerar as partes de um bloco segmentado por um processo do pool, juntando à cache os resultados calculados
+def emitChunk(entry, cache):
+    chunk, result = entry
+    segmentations, computed = result.get()
+    storeResults(cache, computed)
+    for word in chunk:
+        yield word, segmentations[word]
+
+
+# Gerar o documento latex de um texto (lido de fin e escrito em fout), sem fechar nenhum deles. Se não forem
+# indicadas, são usadas caches de composições e de pesquisas no pubchem apenas em memória. Com mais de um processo
+# (jobs), os símbolos e as fórmulas das palavras são obtidos por um pool de processos (que abrem a cache de
+# composições de cachepath apenas para leitura), sendo o documento escrito, pela ordem do texto, pelo processo atual
+def generateLatex(fin, fout, resourcespath, partial=True, formulas=True, compact=False, sparse=False, cache=None,
+                  pubchem=None, pubchemurl=None, lookups=LOOKUPS, offline=False, progress=False, jobs=1,
+                  cachepath=None):
+    # Leitura da informação da tabela periódica e inicialização de variáveis (padrões, caches, ...)
+    periodic_table = loadPeriodicTable(resourcespath + '/periodic_table.info')
+    trieElements = TRIE if not partial else TRIE_CS
+    trieFormulas = FORMULA_TRIE if not partial else FORMULA_TRIE_CS
+    formulas_found = {}
+    formulas_not_found = []
+    memo = OrderedDict()
+    cache = cache if cache is not None else openCache(None)
+    pubchem = pubchem if pubchem is not None else openFormulaCache(None, offline=offline)
+    total_parts = None
+    current_part = 0
+    last_progress = 0
+    pool = Pool(jobs, initWorker, (partial, formulas, cachepath)) if jobs > 1 else None
+
+    # O pool é terminado mesmo que o processamento falhe, para não deixar processos a correr
+    try:
+        # Recolhem-se as fórmulas distintas do texto (e o nº de partes do texto), numa primeira leitura do input, e
+        # obtém-se a informação de todas antes de se escrever o documento
+        formulas_info = {}
+        text = fin
+        if formulas:
+            text = getRewindable(fin)
+            start = text.tell()
+            found = set()
+            total_parts = 0
+            if pool:
+                for word, (symbols, formula) in segmentParallel(pool, jobs, iterTokens(text), cache, formulasOnly=True):
+                    found.add(formula)
+                    total_parts += 1
+            else:
+                for word in iterTokens(text):
+                    found.add(getFormula(cleanWord(word, partial), partial, trieFormulas, cache))
+                    total_parts += 1
+            text.seek(start)
+            formulas_info = resolveFormulas(sorted(found - {''}), pubchem, pubchemurl, lookups)
+
+        # Escreve-se início do documento
+        printInitDocument(fout, resourcespath)
+
+        # Processa-se o texto de input à medida que é lido (e segmentado pelo pool, se existir) e escreve-se o output
+        if pool:
+            parts = segmentParallel(pool, jobs, iterTokens(text), cache)
+        else:
+            parts = ((word, None) for word in iterTokens(text))
+        for word, segmentation in parts:
+            # Imprime-se nº de partes processadas (no total, se conhecido), no máximo a cada PROGRESS_INTERVAL
+            # segundos
+            if progress and time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                last_progress = time.monotonic()
+                print('Processed ' + str(current_part) + ('/' + str(total_parts) if total_parts is not None else ''),
+                      file=sys.stderr, end='\r')
+
+            # Processa-se palavra
+            processWord(word, partial, formulas, trieElements, trieFormulas, 
+                        periodic_table, formulas_found, formulas_not_found, fout, cache, formulas_info, compact, memo,
+                        segmentation)
+
+            # Incrementa-se o nº de partes processadas
+            current_part += 1
+        if progress:
+            print('Processed ' + str(current_part) + ('/' + str(total_parts) if total_parts is not None else ''),
+                  file=sys.stderr, end='\r')
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+
+    # Escreve-se fim do documento, com as imagens espectrais disponíveis localmente (descarregando as que faltam,
+    # exceto em modo offline), apenas dos elementos encontrados no modo esparso
+    shown = {k: e for k, e in periodic_table.items() if not sparse or e['occurrences'] > 0}
+    spectral_images = syncSpectralImages(resourcespath, shown, download=not offline)
+    printEndDocument(fout, periodic_table, formulas_found, spectral_images, sparse)
+
+    # Se o input teve de ser copiado para um ficheiro temporário, fecha-se a cópia
+    if text is not fin:
+        text.close()
+
+
+# Main
+def main():
+    # Processamento de argumentos do comando utilizado
+    fin, fout, resourcespath, partial, formulas, compact, sparse, cachepath, pubchempath, ttl, offline, pubchemurl, lookups, jobs = processArgs()
+
+    # Abrir caches, gerar documento e fechar caches e ficheiros abertos
+    cache = openCache(cachepath)
+    pubchem = openFormulaCache(pubchempath, ttl, offline)
+    generateLatex(fin, fout, resourcespath, partial, formulas, compact, sparse, cache, pubchem, pubchemurl,
+                  lookups, offline, progress=True, jobs=jobs, cachepath=cachepath)
+    closeCache(cache)
+    closeFormulaCache(pubchem)
     fin.close()
     fout.close()
 
-main()
+if __name__ == '__main__':
+    freeze_support()
+    main()
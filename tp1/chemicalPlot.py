@@ -6,28 +6,32 @@ It receives as input a list of words (one word per line) and generates as output
 a chart with the number of occurrences of each chemical element.
 """
 
-import re
-import regex
 import sys
 import getopt
-from collections import Counter, OrderedDict
-import numpy as np
-import matplotlib.pyplot as plt
+from collections import OrderedDict
+from compositionCache import DEFAULT_PATH, openCache, closeCache
+from chemicalCore import processWords
+from elementCounts import newCounts, countComposition, mergeCounts, loadCounts, saveCounts, getOccurrences
 
 # Processar argumentos do comando
 def processArgs():
     inputfile = ''
     outputfile = ''
+    cachepath = DEFAULT_PATH
+    storefile = ''
+    merge = False
+    usage = 'chemicalPlot [--nocache] [-s <storefile>] [-i <inputfile>] [-o <outputfile>]\n' + \
+            'chemicalPlot --merge [-s <storefile>] [-o <outputfile>] <storefile> ...'
 
     # Processar opções/argumentos do comando utilizado
     try: 
-        opts, args = getopt.getopt(sys.argv[1:],"i:o:hv",["ifile=","ofile=","help","version"])
+        opts, args = getopt.getopt(sys.argv[1:],"i:o:s:hv",["ifile=","ofile=","store=","merge","help","version","nocache"])
     except getopt.GetoptError:
-        print('chemical [-i <inputfile>] [-o <outputfile>]')
+        print(usage)
         sys.exit(2)
     for opt, arg in opts:
         if opt in ('-h', '--help'):
-            print('chemical [-i <inputfile>] [-o <outputfile>]')
+            print(usage)
             sys.exit()
         elif opt in ('-v', '--version'):
             print('Version 1.0')
@@ -36,32 +40,33 @@ def processArgs():
             inputfile = arg
         elif opt in ("-o", "--ofile"):
             outputfile = arg
+        elif opt in ("-s", "--store"):
+            storefile = arg
+        elif opt == "--merge":
+            merge = True
+        elif opt == "--nocache":
+            cachepath = None
+
+    if merge and not args:
+        print(usage)
+        sys.exit(2)
 
-    # Definir input e output
-    fin = sys.stdin if not inputfile else open(inputfile, 'r')
-    if not outputfile:
+    # Definir input e output (as contagens guardadas num ficheiro só são desenhadas se for indicada a imagem)
+    fin = None
+    if not merge:
+        fin = sys.stdin if not inputfile else open(inputfile, 'r')
+    if not outputfile and not storefile:
         outputfile = 'imagem.svg'
 
-    return fin, outputfile
-
-
-# Remover acentos de uma palavra
-def clean_accents(word):
-    word = re.sub(r'[áàãâ]', r'a', word)
-    word = re.sub(r'[ÁÀÃÂ]', r'A', word)
-    word = re.sub(r'[éèê]', r'e', word)
-    word = re.sub(r'[ÉÈÊ]', r'E', word)
-    word = re.sub(r'[íìî]', r'i', word)
-    word = re.sub(r'[ÍÌÎ]', r'I', word)
-    word = re.sub(r'[óòõô]', r'o', word)
-    word = re.sub(r'[ÓÒÕÔ]', r'O', word)
-    word = re.sub(r'[úùû]', r'u', word)
-    word = re.sub(r'[ÚÙÛ]', r'U', word)
-    return word
+    return fin, outputfile, cachepath, storefile, args if merge else []
 
 
-# Desenhar gráfico de barras e guardá-lo como imagem
+# Desenhar gráfico de barras e guardá-lo como imagem (o numpy e o matplotlib só são importados quando é preciso
+# desenhar o gráfico)
 def drawPlot(c, outfile):
+    import numpy as np
+    import matplotlib.pyplot as plt
+
     # Obtenção das abcissas e ordenadas
     labels, values = zip(*c.items())
     n = len(labels)
@@ -87,32 +92,47 @@ def drawPlot(c, outfile):
     plt.savefig(outfile)
 
 
+# Obter as contagens das ocorrências dos elementos químicos nas composições de um iterável de palavras
+def countOccurrences(words, cache=None):
+    counts = newCounts()
+    for word, compositions in processWords(words, cache=cache):
+        for composition in compositions:
+            countComposition(counts, composition)
+    return counts
+
+
 # Main
 def main ():
     # Processamento de argumentos do comando utilizado
-    fin, outfile = processArgs()  
-
-    # Definir elementos químicos e expressão regular
-    chemical_symbols = ['H', 'He', 'Li', 'Be', 'B', 'C', 'N', 'O', 'F', 'Ne', 'Na', 'Mg', 'Al', 'Si', 'P', 'S', 'Cl', 'Ar', 'K', 'Ca', 'Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe', 'Co', 'Ni', 'Cu', 'Zn', 'Ga', 'Ge', 'As', 'Se', 'Br', 'Kr', 'Rb', 'Sr', 'Y', 'Zr', 'Nb', 'Mo', 'Tc', 'Ru', 'Rh', 'Pd', 'Ag', 'Cd', 'In', 'Sn', 'Sb', 'Te', 'I', 'Xe', 'Cs', 'Ba', 'La', 'Ce', 'Pr', 'Nd', 'Pm', 'Sm', 'Eu', 'Gd', 'Tb', 'Dy', 'Ho', 'Er', 'Tm', 'Yb', 'Lu', 'Hf', 'Ta', 'W', 'Re', 'Os', 'Ir', 'Pt', 'Au', 'Hg', 'Tl', 'Pb', 'Bi', 'Po', 'At', 'Rn', 'Fr', 'Ra', 'Ac', 'Th', 'Pa', 'U', 'Np', 'Pu', 'Am', 'Cm', 'Bk', 'Cf', 'Es', 'Fm', 'Md', 'No', 'Lr', 'Rf', 'Db', 'Sg', 'Bh', 'Hs', 'Mt', 'Ds', 'Rg', 'Cn', 'Nh', 'Fl', 'Mc', 'Lv', 'Ts', 'Og']
-    pattern = r'^(' + '|'.join(chemical_symbols) + r')+$'
-    c = Counter()
-
-    # Obter todas as matches das palavras fornecidas e contabilizar nº de ocorrências dos elementos químicos
-    for line in fin:
-        word = line.rstrip().split('\t')[-1]
-        word_no_acc = clean_accents(word).lower()
-        if re.search(pattern, word_no_acc, re.IGNORECASE):
-            composition = regex.match(pattern, word_no_acc, flags=regex.IGNORECASE).captures(1)
-            for elem in composition:
-                c[elem] += 1
-
-    # Ordenar as ocorrências dos elementos químicos de forma decrescente
-    c = OrderedDict(reversed(c.most_common()))
-
-    # Desenhar gráfico de barras em imagem
-    drawPlot(c, outfile)
-
-    # Fechar ficheiro de input
-    fin.close()
-
-main()
\ No newline at end of file
+    fin, outfile, cachepath, storefile, stores = processArgs()  
+
+    counts = newCounts()
+
+    # Juntar as contagens guardadas por várias execuções ou obter todas as matches das palavras fornecidas e
+    # contabilizar nº de ocorrências dos elementos químicos
+    if stores:
+        for filename in stores:
+            try:
+                mergeCounts(counts, loadCounts(filename))
+            except (OSError, ValueError) as e:
+                print('Error: ' + str(e), file=sys.stderr)
+                sys.exit(2)
+    else:
+        cache = openCache(cachepath)
+        counts = countOccurrences((line.rstrip().split('\t')[-1] for line in fin), cache)
+        closeCache(cache)
+
+        # Fechar ficheiro de input
+        fin.close()
+
+    # Guardar as contagens, de forma a poderem ser juntadas às de outras execuções
+    if storefile:
+        saveCounts(counts, storefile)
+
+    # Ordenar as ocorrências dos elementos químicos de forma decrescente e desenhar gráfico de barras em imagem
+    if outfile:
+        c = OrderedDict(reversed(getOccurrences(counts)))
+        drawPlot(c, outfile)
+
+if __name__ == '__main__':
+    main()
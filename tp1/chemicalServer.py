@@ -0,0 +1,334 @@
+#!/usr/bin/python3
+
+"""Long-running service of the chemical tools.
+
+It keeps the periodic table, the segmentation tries and the caches of compositions and of PubChem searches loaded
+between requests, so that tools processing many small texts (or an editor plugin) don't pay the start-up cost of
+chemical/chemicalLatex for each one. It listens on localhost (HTTP) or on a Unix socket and answers, as JSON,
+batches of words or of text fragments (POST, with a JSON body):
+
+  /words  {"words": [...], "mode": "first" | "all" | "count" | "top:<k>"}
+          compositions of each word, as given by chemical
+  /text   {"texts": [...], "all": false, "formulas": true, "latex": false}
+          for each text, the first composition and the formula (and its PubChem information) of each word, as
+          found by chemicalLatex, and optionally the latex of the text
+
+GET /status reports the number of requests answered and of compositions cached in memory.
+"""
+
+import io
+import os
+import sys
+import json
+import getopt
+import signal
+import stat
+import threading
+import socketserver
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from chemicalCore import processWords, TRIE, TRIE_CS, FORMULA_TRIE, FORMULA_TRIE_CS
+from chemicalLatex import LOOKUPS, iterTokens, cleanWord, getElements, getFormula, resolveFormulas, processWord
+from compositionCache import DEFAULT_PATH, openCache, flushCache, closeCache
+from pubchemCache import DEFAULT_PATH as PUBCHEM_PATH, DEFAULT_TTL, openFormulaCache, closeFormulaCache
+from periodicTable import loadPeriodicTable
+
+BASEDIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PORT = 8009
+
+# Tamanho máximo (em bytes) do corpo de um pedido
+MAX_REQUEST = 1 << 24
+
+
+# Processar argumentos do comando
+def processArgs():
+    port = DEFAULT_PORT
+    socketpath = None
+    resourcespath = BASEDIR + '/resources'
+    cachepath = DEFAULT_PATH
+    pubchempath = PUBCHEM_PATH
+    ttl = DEFAULT_TTL
+    offline = False
+    pubchemurl = None
+    lookups = LOOKUPS
+    usage = 'Chemical Server\n' + \
+            'Usage:\n\tchemicalServer [-p <port> | -u <socketfile>] [-r <resourcesfolder>] [--nocache] [--offline] [--ttl <days>] [--pubchem <url>] [--lookups <n>]\n' + \
+            'Options:\n\t-p | --port\t\tUsed to indicate the localhost port to listen on (default 8009)\n\t-u | --unix\t\tUsed to indicate a Unix socket to listen on, instead of a port\n\t-r | --resources\tUsed to indicate the resources folder (periodic table)\n\t--nocache\t\tDoesn\'t use the persistent caches of compositions and PubChem searches\n\t--offline\t\tDoesn\'t search PubChem, only uses the information already cached\n\t--ttl\t\t\tUsed to indicate the number of days PubChem searches stay cached (default 30)\n\t--pubchem\t\tUsed to indicate the URL of the PubChem REST API (e.g. a local stand-in server)\n\t--lookups\t\tUsed to indicate the number of concurrent PubChem searches (default 4)'
+
+    # Processar opções/argumentos do comando utilizado
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'p:u:r:h', ['port=', 'unix=', 'resources=', 'help', 'nocache',
+                                                            'offline', 'ttl=', 'pubchem=', 'lookups='])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            print(usage)
+            sys.exit()
+        elif opt in ('-p', '--port'):
+            if not arg.isdigit():
+                print(usage)
+                sys.exit(2)
+            port = int(arg)
+        elif opt in ('-u', '--unix'):
+            socketpath = arg
+        elif opt in ('-r', '--resources'):
+            resourcespath = arg.rstrip('/')
+        elif opt == '--nocache':
+            cachepath = None
+            pubchempath = None
+        elif opt == '--offline':
+            offline = True
+        elif opt == '--ttl':
+            try:
+                ttl = float(arg) * 24 * 60 * 60
+            except ValueError:
+                print(usage)
+                sys.exit(2)
+        elif opt == '--pubchem':
+            pubchemurl = arg
+        elif opt == '--lookups':
+            if not arg.isdigit() or int(arg) == 0:
+                print(usage)
+                sys.exit(2)
+            lookups = int(arg)
+
+    # Por omissão, usam-se os recursos junto ao programa ou, se não existirem, os recursos instalados
+    if not os.path.isfile(resourcespath + '/periodic_table.info') and resourcespath == BASEDIR + '/resources':
+        resourcespath = '/usr/local/bin/resources'
+    if not os.path.isfile(resourcespath + '/periodic_table.info'):
+        print('Chemical Server\nError: No file \'' + resourcespath + '/periodic_table.info\' found')
+        sys.exit(3)
+
+    return port, socketpath, resourcespath, cachepath, pubchempath, ttl, offline, pubchemurl, lookups
+
+
+# Criar o estado do serviço: tabela periódica e caches (que se mantêm carregadas entre pedidos). Os pedidos são
+# processados um de cada vez (lock), pois as caches não podem ser usadas em simultâneo por várias threads
+def openService(resourcespath, cache=None, pubchem=None, pubchemurl=None, lookups=LOOKUPS):
+    return {'ptable': loadPeriodicTable(resourcespath + '/periodic_table.info'),
+            'cache': cache if cache is not None else openCache(None),
+            'pubchem': pubchem if pubchem is not None else openFormulaCache(None),
+            'pubchemurl': pubchemurl, 'lookups': lookups, 'lock': threading.Lock(), 'requests': 0}
+
+
+# Obter uma lista de textos de um pedido (ValueError, se não for uma lista de textos)
+def getTexts(request, key):
+    texts = request.get(key) if isinstance(request, dict) else None
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        raise ValueError('\'' + key + '\' must be a list of strings')
+    return texts
+
+
+# Obter as opções do chemical correspondentes a um modo (first, all, count ou top:K)
+def parseMode(mode):
+    if mode in ('first', 'all', 'count'):
+        return mode == 'all', mode == 'count', 0
+    if isinstance(mode, str) and mode.startswith('top:') and mode[4:].isdigit() and int(mode[4:]) > 0:
+        return False, False, int(mode[4:])
+    raise ValueError('unknown mode: ' + str(mode))
+
+
+# Responder a um pedido de composições de palavras (como no chemical)
+def processWordsRequest(service, request):
+    words = getTexts(request, 'words')
+    allMatches, countOnly, top = parseMode(request.get('mode', 'first'))
+
+    results = []
+    for word, result in processWords(words, allMatches, countOnly, top, service['cache']):
+        if countOnly:
+            results.append({'word': word, 'count': result})
+        else:
+            results.append({'word': word, 'compositions': [list(c) for c in result]})
+    return {'results': results}
+
+
+# Responder a um pedido de processamento de fragmentos de texto (como no chemicalLatex): composição e fórmula de
+# cada palavra e, opcionalmente, o latex de cada fragmento
+def processTextRequest(service, request):
+    texts = getTexts(request, 'texts')
+    partial = not request.get('all', False)
+    formulas = request.get('formulas', True)
+    latex = request.get('latex', False)
+    trieElements = TRIE if not partial else TRIE_CS
+    trieFormulas = FORMULA_TRIE if not partial else FORMULA_TRIE_CS
+    cache = service['cache']
+
+    # Obtém-se a informação de todas as fórmulas distintas dos fragmentos antes de os processar
+    fragments = [list(iterTokens(io.StringIO(text))) for text in texts]
+    formulas_info = {}
+    if formulas:
+        found = {getFormula(cleanWord(word, partial), partial, trieFormulas, cache) for words in fragments for word in words}
+        formulas_info = resolveFormulas(sorted(found - {''}), service['pubchem'], service['pubchemurl'],
+                                        service['lookups'])
+
+    results = []
+    for words in fragments:
+        result = {'words': []}
+        for word in words:
+            if not word[0].isalnum() and word[0] != '_':
+                continue
+            word_clean = cleanWord(word, partial)
+            composition = getElements(word_clean, partial, trieElements, cache)
+            entry = {'word': word, 'composition': list(composition) if composition else None}
+            formula = getFormula(word_clean, partial, trieFormulas, cache) if formulas else ''
+            if formula:
+                entry['formula'] = formula
+                entry['info'] = formulas_info.get(formula) or None
+            result['words'].append(entry)
+
+        # O latex de cada fragmento é gerado com uma cópia da tabela periódica (as ocorrências dos elementos não
+        # se acumulam entre fragmentos nem entre pedidos)
+        if latex:
+            ptable = {key: dict(e) for key, e in service['ptable'].items()}
+            fout = io.StringIO()
+            formulas_found = {}
+            formulas_not_found = []
+            for word in words:
+                processWord(word, partial, formulas, trieElements, trieFormulas, ptable, formulas_found,
+                            formulas_not_found, fout, cache, formulas_info)
+            result['latex'] = fout.getvalue()
+        results.append(result)
+
+    return {'results': results}
+
+
+ENDPOINTS = {'/words': processWordsRequest, '/text': processTextRequest}
+
+
+# Criar a classe que responde aos pedidos HTTP (GET /status e POST nos ENDPOINTS) com o estado do serviço
+def buildHandler(service):
+    class ChemicalHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/status':
+                self.answer(404, {'error': 'not found: ' + self.path})
+                return
+            with service['lock']:
+                status = {'requests': service['requests'], 'cached': len(service['cache']['lru'])}
+            self.answer(200, status)
+
+        def do_POST(self):
+            # Sem um tamanho válido do corpo, não se sabe quanto ler, pelo que a ligação é fechada
+            try:
+                length = int(self.headers['Content-Length'])
+            except (TypeError, ValueError):
+                length = -1
+            if length < 0:
+                self.close_connection = True
+                self.answer(411 if 'Content-Length' not in self.headers else 400, {'error': 'invalid Content-Length'})
+                return
+            if length > MAX_REQUEST:
+                self.close_connection = True
+                self.answer(413, {'error': 'request too large'})
+                return
+            handler = ENDPOINTS.get(self.path.split('?')[0])
+            try:
+                request = json.loads(self.rfile.read(length).decode())
+            except ValueError:
+                self.answer(400, {'error': 'invalid JSON'})
+                return
+            if not handler:
+                self.answer(404, {'error': 'not found: ' + self.path})
+                return
+
+            # Os resultados calculados são guardados em disco no fim de cada pedido
+            try:
+                with service['lock']:
+                    body = handler(service, request)
+                    flushCache(service['cache'])
+                    service['requests'] += 1
+            except ValueError as e:
+                self.answer(400, {'error': str(e)})
+                return
+            except Exception as e:
+                self.answer(500, {'error': type(e).__name__ + ': ' + str(e)})
+                return
+            self.answer(200, body)
+
+        def answer(self, status, body):
+            content = json.dumps(body, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ChemicalHandler
+
+
+# Servidor HTTP num socket Unix (cada ligação é atendida numa thread, como no ThreadingHTTPServer)
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ('unix', 0)
+
+
+# Verificar se um caminho é um socket Unix
+def isSocket(path):
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+# Criar o servidor, em localhost (porto 0: porto livre escolhido pelo sistema) ou num socket Unix, devolvendo o
+# servidor e o respetivo endereço. Um socket deixado por uma execução anterior é substituído, mas qualquer outro
+# ficheiro com o mesmo caminho não é apagado (ValueError)
+def createServer(service, port=DEFAULT_PORT, socketpath=None):
+    if socketpath:
+        if isSocket(socketpath):
+            os.remove(socketpath)
+        elif os.path.lexists(socketpath):
+            raise ValueError('\'' + socketpath + '\' exists and is not a socket')
+        server = UnixHTTPServer(socketpath, buildHandler(service))
+        return server, 'unix:' + socketpath
+    server = ThreadingHTTPServer(('localhost', port), buildHandler(service))
+    return server, 'http://localhost:' + str(server.server_address[1])
+
+
+# Iniciar o servidor numa thread, devolvendo o servidor e o respetivo endereço
+def startServer(service, port=0, socketpath=None):
+    server, address = createServer(service, port, socketpath)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, address
+
+
+# Main
+def main():
+    port, socketpath, resourcespath, cachepath, pubchempath, ttl, offline, pubchemurl, lookups = processArgs()
+
+    # Abrir caches e atender pedidos até o serviço ser terminado (SIGINT ou SIGTERM), fechando então as caches
+    cache = openCache(cachepath)
+    pubchem = openFormulaCache(pubchempath, ttl, offline)
+    service = openService(resourcespath, cache, pubchem, pubchemurl, lookups)
+    try:
+        server, address = createServer(service, port, socketpath)
+    except ValueError as e:
+        closeCache(cache)
+        closeFormulaCache(pubchem)
+        print('Chemical Server\nError: ' + str(e))
+        sys.exit(3)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print('Chemical Server serving on ' + address, file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socketpath and isSocket(socketpath):
+            os.remove(socketpath)
+        with service['lock']:
+            closeCache(cache)
+            closeFormulaCache(pubchem)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+
+"""Persistent cache for the chemical compositions of words.
+
+It is shared by chemical, chemicalLatex and chemicalPlot. The results are kept in memory (LRU) and on disk
+(sqlite), keyed by the accent-folded word and by the match mode, so that repeated runs over the same
+vocabulary skip the segmentation of the words already seen.
+"""
+
+import os
+import sys
+import json
+import sqlite3
+from collections import OrderedDict
+
+# Versão do formato dos resultados (ao ser alterada, os resultados guardados em disco são descartados)
+CACHE_VERSION = 1
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'chemical', 'compositions.db')
+MAX_SIZE = 100000
+FLUSH_SIZE = 1000
+_MISSING = object()
+
+
+# Abrir a cache de composições (apenas em memória, se não for indicado ficheiro ou se este não puder ser aberto).
+# Uma cache aberta apenas para leitura (p.e. nos processos de um pool) não escreve em disco os resultados que
+# calcula, que devem ser recolhidos com takePending e guardados pelo processo que abriu a cache para escrita
+def openCache(path=DEFAULT_PATH, maxsize=MAX_SIZE, readOnly=False):
+    db = None
+    if path:
+        try:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False)
+            if readOnly:
+                db.execute('PRAGMA query_only = ON')
+            elif db.execute('PRAGMA user_version').fetchone()[0] != CACHE_VERSION:
+                db.execute('DROP TABLE IF EXISTS compositions')
+                db.execute('PRAGMA user_version = ' + str(CACHE_VERSION))
+            if not readOnly:
+                db.execute('PRAGMA journal_mode = WAL')
+                db.execute('CREATE TABLE IF NOT EXISTS compositions ' +
+                           '(word TEXT, mode TEXT, result TEXT, PRIMARY KEY (word, mode))')
+                db.commit()
+        except (OSError, sqlite3.Error) as e:
+            print('Warning: composition cache not available (' + str(e) + ')', file=sys.stderr)
+            db = None
+
+    return {'lru': OrderedDict(), 'maxsize': maxsize, 'db': db, 'pending': [], 'readonly': readOnly}
+
+
+# Converter um resultado para texto, de forma a ser guardado em disco
+def encodeResult(result):
+    return json.dumps(result, ensure_ascii=False)
+
+
+# Converter um resultado guardado em disco (as composições são listas de tuplos de símbolos)
+def decodeResult(text):
+    result = json.loads(text)
+    if isinstance(result, list):
+        result = [tuple(c) if isinstance(c, list) else c for c in result]
+    return result
+
+
+# Obter o resultado de uma palavra num determinado modo, procurando-o primeiro em memória, depois em disco e,
+# apenas se não for encontrado, calculando-o com a função fornecida (resultados negativos também são guardados)
+def getComposition(cache, word, mode, compute):
+    key = (word, mode)
+    lru = cache['lru']
+    if key in lru:
+        lru.move_to_end(key)
+        return lru[key]
+
+    result = _MISSING
+    if cache['db']:
+        try:
+            row = cache['db'].execute('SELECT result FROM compositions WHERE word = ? AND mode = ?', key).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        if row:
+            result = decodeResult(row[0])
+    if result is _MISSING:
+        result = compute(word)
+        if cache['db']:
+            cache['pending'].append((word, mode, encodeResult(result)))
+            if len(cache['pending']) >= FLUSH_SIZE and not cache['readonly']:
+                flushCache(cache)
+
+    lru[key] = result
+    if len(lru) > cache['maxsize']:
+        lru.popitem(last=False)
+    return result
+
+
+# Recolher os resultados calculados por uma cache aberta apenas para leitura, ainda não guardados em disco
+def takePending(cache):
+    pending = cache['pending']
+    cache['pending'] = []
+    return pending
+
+
+# Juntar aos resultados a guardar em disco os resultados calculados por outro processo
+def storeResults(cache, results):
+    if cache['db'] and results:
+        cache['pending'].extend(results)
+        if len(cache['pending']) >= FLUSH_SIZE:
+            flushCache(cache)
+
+
+# Escrever em disco os resultados calculados desde a última escrita
+def flushCache(cache):
+    if cache['db'] and cache['pending'] and not cache['readonly']:
+        cache['db'].executemany('INSERT OR REPLACE INTO compositions VALUES (?, ?, ?)', cache['pending'])
+        cache['db'].commit()
+    cache['pending'] = []
+
+
+# Fechar a cache, escrevendo os resultados pendentes
+def closeCache(cache):
+    flushCache(cache)
+    if cache['db']:
+        cache['db'].close()
+        cache['db'] = None
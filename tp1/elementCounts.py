@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+
+"""Occurrence counts of the chemical elements, used by chemicalPlot.
+
+The counts are kept in an array with one slot per chemical element, indexed by atomic number, and can be saved
+in a small binary store (a fixed-size file with a header and one 64-bit count per element). Stores written by
+separate runs (e.g. over different corpora, in parallel jobs) can then be merged by adding their counts,
+without processing the texts again.
+"""
+
+import os
+import struct
+from array import array
+from chemicalCore import CHEMICAL_SYMBOLS
+
+# Cabeçalho (com a versão do formato) e formato dos ficheiros de contagens
+MAGIC = b'CHEMCNT1'
+STORE_FORMAT = '<8s' + str(len(CHEMICAL_SYMBOLS)) + 'Q'
+SYMBOL_INDEX = {symb: index for index, symb in enumerate(CHEMICAL_SYMBOLS)}
+
+
+# Criar contagens vazias (uma posição por elemento químico, pela ordem do nº atómico)
+def newCounts():
+    return array('Q', [0]) * len(CHEMICAL_SYMBOLS)
+
+
+# Contabilizar os elementos químicos de uma composição
+def countComposition(counts, composition):
+    for symb in composition:
+        counts[SYMBOL_INDEX[symb]] += 1
+
+
+# Adicionar às contagens as contagens de outra execução
+def mergeCounts(counts, other):
+    for index, n in enumerate(other):
+        counts[index] += n
+
+
+# Carregar as contagens guardadas num ficheiro (ValueError, se o ficheiro não for um ficheiro de contagens)
+def loadCounts(filename):
+    fd = open(filename, 'rb')
+    content = fd.read()
+    fd.close()
+
+    if len(content) != struct.calcsize(STORE_FORMAT) or not content.startswith(MAGIC):
+        raise ValueError(filename + ' is not an element count store')
+    return array('Q', struct.unpack(STORE_FORMAT, content)[1:])
+
+
+# Guardar as contagens num ficheiro, escrevendo-as primeiro num ficheiro temporário, de forma a que uma escrita
+# interrompida não deixe o ficheiro incompleto
+def saveCounts(counts, filename):
+    tmpname = filename + '.tmp'
+    fd = open(tmpname, 'wb')
+    fd.write(struct.pack(STORE_FORMAT, MAGIC, *counts))
+    fd.close()
+    os.replace(tmpname, filename)
+
+
+# Obter os elementos químicos que ocorrem e respetivo nº de ocorrências, por ordem decrescente de ocorrências (os
+# elementos com o mesmo nº de ocorrências ficam pela ordem do nº atómico)
+def getOccurrences(counts):
+    occurrences = [(CHEMICAL_SYMBOLS[index].lower(), n) for index, n in enumerate(counts) if n > 0]
+    return sorted(occurrences, key=lambda e: -e[1])
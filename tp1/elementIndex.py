@@ -0,0 +1,281 @@
+#!/usr/bin/python3
+
+"""Index of the words of dictionaries that can be written as a sequence of chemical symbols.
+
+Each such word is stored with one row per distinct set of chemical elements it can be written with: a 128-bit mask
+of the elements (bit i is set if the element with atomic number i+1 occurs) and the first composition using exactly
+those elements. The index is a compact binary file: a header, the masks, the word of each row, the offsets of the
+compositions and of the words, the compositions (atomic numbers, one byte each) and the words. Questions about the
+elements the words can be written with ("which words can be written using only noble gases and halogens", "which
+words can be written using Fe") are then answered by vectorized scans of the array of masks, instead of segmenting
+the dictionaries again: a word is found if any of its rows satisfies all the conditions.
+
+  elementIndex -d <dictionary> -i <indexfile>             builds the index (the dictionaries have one word per line)
+  elementIndex -i <indexfile> --only noble-gases,halogens queries it
+"""
+
+import os
+import sys
+import struct
+import getopt
+from array import array
+from chemicalCore import CHEMICAL_SYMBOLS, processWords
+from compositionCache import DEFAULT_PATH, openCache, closeCache
+from elementCounts import SYMBOL_INDEX
+
+# Cabeçalho (com a versão do formato, nº de palavras, nº de linhas, nº de símbolos das composições e tamanho das
+# palavras) dos ficheiros de índice
+MAGIC = b'CHEMIDX2'
+HEADER_FORMAT = '<8sQQQQ'
+
+# Grupos de elementos químicos que podem ser usados nas pesquisas, além dos símbolos
+GROUPS = {
+    'alkali-metals': ['Li', 'Na', 'K', 'Rb', 'Cs', 'Fr'],
+    'alkaline-earth-metals': ['Be', 'Mg', 'Ca', 'Sr', 'Ba', 'Ra'],
+    'halogens': ['F', 'Cl', 'Br', 'I', 'At', 'Ts'],
+    'noble-gases': ['He', 'Ne', 'Ar', 'Kr', 'Xe', 'Rn', 'Og'],
+    'lanthanides': CHEMICAL_SYMBOLS[56:71],
+    'actinides': CHEMICAL_SYMBOLS[88:103]
+}
+SYMBOLS = {symb.lower(): symb for symb in CHEMICAL_SYMBOLS}
+
+
+# Processar argumentos do comando
+def processArgs():
+    dictionaries = []
+    indexfile = ''
+    outputfile = ''
+    cachepath = DEFAULT_PATH
+    queries = {}
+    countOnly = False
+    usage = 'Element Index\n' + \
+            'Usage:\n\telementIndex [-d <dictionary>]... [--nocache] -i <indexfile> [--only <elements>] [--all <elements>] [--any <elements>] [--none <elements>] [-c] [-o <outputfile>]\n' + \
+            'Options:\n\t-d | --dictionary\tUsed to indicate a dictionary (one word per line) to build the index from\n\t-i | --index\t\tUsed to indicate the index file\n\t--only\t\t\tWords that can be written using only the given elements\n\t--all\t\t\tWords that can be written using all the given elements\n\t--any\t\t\tWords that can be written using any of the given elements\n\t--none\t\t\tWords that can be written using none of the given elements\n\t-c | --count\t\tOnly writes the number of words found\n\t--nocache\t\tDoesn\'t use the persistent cache of compositions\n\t-o | --ofile\t\tUsed to indicate output file\n' + \
+            'Elements:\n\tComma separated chemical symbols or groups (' + ', '.join(sorted(GROUPS)) + ')'
+
+    # Processar opções/argumentos do comando utilizado
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'd:i:o:ch', ['dictionary=', 'index=', 'ofile=', 'count', 'help',
+                                                            'only=', 'all=', 'any=', 'none=', 'nocache'])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            print(usage)
+            sys.exit()
+        elif opt in ('-d', '--dictionary'):
+            dictionaries.append(arg)
+        elif opt in ('-i', '--index'):
+            indexfile = arg
+        elif opt in ('-o', '--ofile'):
+            outputfile = arg
+        elif opt in ('-c', '--count'):
+            countOnly = True
+        elif opt == '--nocache':
+            cachepath = None
+        elif opt in ('--only', '--all', '--any', '--none'):
+            try:
+                queries[opt[2:]] = parseElements(arg)
+            except ValueError as e:
+                print('Element Index\nError: ' + str(e))
+                sys.exit(2)
+
+    if not indexfile:
+        print(usage)
+        sys.exit(2)
+
+    return dictionaries, indexfile, outputfile, cachepath, queries, countOnly
+
+
+# Obter a máscara de um conjunto de elementos químicos, indicados por símbolos ou grupos separados por vírgulas
+# (ValueError, se algum não existir)
+def parseElements(text):
+    mask = 0
+    for name in text.split(','):
+        name = name.strip()
+        if name.lower() in GROUPS:
+            symbols = GROUPS[name.lower()]
+        elif name.lower() in SYMBOLS:
+            symbols = [SYMBOLS[name.lower()]]
+        else:
+            raise ValueError('unknown chemical element or group: ' + name)
+        for symb in symbols:
+            mask |= 1 << SYMBOL_INDEX[symb]
+    return mask
+
+
+# Obter a máscara dos elementos químicos de uma composição
+def getMask(composition):
+    mask = 0
+    for symb in composition:
+        mask |= 1 << SYMBOL_INDEX[symb]
+    return mask
+
+
+# Dividir uma máscara nas suas metades de 64 bits (elementos 1 a 64 e 65 a 128)
+def splitMask(mask):
+    return mask & 0xFFFFFFFFFFFFFFFF, mask >> 64
+
+
+# Obter as palavras distintas de dicionários (uma palavra por linha, sendo a palavra a última coluna, como no
+# chemicalPlot), pela ordem em que aparecem
+def readDictionaries(filenames):
+    words = {}
+    for filename in filenames:
+        fd = open(filename)
+        for line in fd:
+            word = line.rstrip().split('\t')[-1]
+            if word:
+                words[word] = True
+        fd.close()
+    return list(words)
+
+
+# Construir o índice das palavras que podem ser escritas como sequência de símbolos químicos: lista de palavras
+# e respetivas composições (todas, como no chemical -a), mantendo apenas a primeira de cada conjunto de elementos,
+# já que as pesquisas só dependem dos elementos usados
+def buildIndex(words, cache=None):
+    entries = []
+    for word, result in processWords(words, allMatches=True, cache=cache):
+        compositions = {}
+        for composition in result:
+            compositions.setdefault(getMask(composition), composition)
+        if compositions:
+            entries.append((word, list(compositions.values())))
+    return entries
+
+
+# Guardar um índice num ficheiro, escrevendo-o primeiro num ficheiro temporário, de forma a que uma escrita
+# interrompida não deixe o ficheiro incompleto
+def saveIndex(entries, filename):
+    masks = array('Q')
+    rowWords = array('I')
+    compositionOffsets = array('I', [0])
+    wordOffsets = array('I', [0])
+    compositions = bytearray()
+    words = bytearray()
+    for i, (word, wordCompositions) in enumerate(entries):
+        for composition in wordCompositions:
+            masks.extend(splitMask(getMask(composition)))
+            rowWords.append(i)
+            compositions.extend(SYMBOL_INDEX[symb] + 1 for symb in composition)
+            compositionOffsets.append(len(compositions))
+        words.extend(word.encode())
+        wordOffsets.append(len(words))
+    if sys.byteorder != 'little':
+        for a in (masks, rowWords, compositionOffsets, wordOffsets):
+            a.byteswap()
+
+    tmpname = filename + '.tmp'
+    fd = open(tmpname, 'wb')
+    fd.write(struct.pack(HEADER_FORMAT, MAGIC, len(entries), len(rowWords), len(compositions), len(words)))
+    for part in (masks, rowWords, compositionOffsets, wordOffsets, compositions, words):
+        fd.write(part)
+    fd.close()
+    os.replace(tmpname, filename)
+
+
+# Carregar um índice guardado num ficheiro (ValueError, se o ficheiro não for um índice). O numpy só é importado
+# quando é preciso pesquisar num índice
+def loadIndex(filename):
+    import numpy as np
+
+    fd = open(filename, 'rb')
+    content = fd.read()
+    fd.close()
+
+    start = struct.calcsize(HEADER_FORMAT)
+    if len(content) < start or not content.startswith(MAGIC):
+        raise ValueError(filename + ' is not an element index')
+    _, n, rows, ncompositions, nwords = struct.unpack_from(HEADER_FORMAT, content)
+    if len(content) != start + 16 * rows + 4 * rows + 4 * (rows + 1) + 4 * (n + 1) + ncompositions + nwords:
+        raise ValueError(filename + ' is not an element index')
+
+    masks = np.frombuffer(content, dtype='<u8', count=2 * rows, offset=start).reshape(rows, 2)
+    start += 16 * rows
+    rowWords = np.frombuffer(content, dtype='<u4', count=rows, offset=start)
+    start += 4 * rows
+    compositionOffsets = np.frombuffer(content, dtype='<u4', count=rows + 1, offset=start)
+    start += 4 * (rows + 1)
+    wordOffsets = np.frombuffer(content, dtype='<u4', count=n + 1, offset=start)
+    start += 4 * (n + 1)
+    return {'size': n, 'rows': rows, 'masks': masks, 'rowWords': rowWords, 'compositionOffsets': compositionOffsets,
+            'wordOffsets': wordOffsets, 'compositions': content[start:start + ncompositions],
+            'words': content[start + ncompositions:]}
+
+
+# Obter a palavra e a composição de uma linha do índice
+def getEntry(index, row):
+    wo = index['wordOffsets']
+    co = index['compositionOffsets']
+    i = index['rowWords'][row]
+    word = index['words'][wo[i]:wo[i + 1]].decode()
+    composition = tuple(CHEMICAL_SYMBOLS[n - 1] for n in index['compositions'][co[row]:co[row + 1]])
+    return word, composition
+
+
+# Obter as linhas do índice das palavras que podem ser escritas usando apenas elementos de only, todos os
+# elementos de using, algum dos elementos de anyOf e nenhum dos elementos de none (máscaras; None, se a condição
+# não for usada): uma linha por palavra, a primeira cujos elementos satisfazem todas as condições
+def queryIndex(index, only=None, using=None, anyOf=None, none=None):
+    import numpy as np
+
+    low = index['masks'][:, 0]
+    high = index['masks'][:, 1]
+    selected = np.ones(index['rows'], dtype=bool)
+    if only is not None:
+        qlow, qhigh = (np.uint64(m) for m in splitMask(only))
+        selected &= ((low & ~qlow) == 0) & ((high & ~qhigh) == 0)
+    if using is not None:
+        qlow, qhigh = (np.uint64(m) for m in splitMask(using))
+        selected &= ((low & qlow) == qlow) & ((high & qhigh) == qhigh)
+    if anyOf is not None:
+        qlow, qhigh = (np.uint64(m) for m in splitMask(anyOf))
+        selected &= ((low & qlow) | (high & qhigh)) != 0
+    if none is not None:
+        qlow, qhigh = (np.uint64(m) for m in splitMask(none))
+        selected &= ((low & qlow) | (high & qhigh)) == 0
+
+    # As linhas de cada palavra são consecutivas, pelo que a primeira linha encontrada de cada palavra é a que
+    # tem uma palavra diferente da linha encontrada anterior
+    rows = np.flatnonzero(selected)
+    words = index['rowWords'][rows]
+    return rows[np.concatenate(([True], words[1:] != words[:-1]))] if len(rows) else rows
+
+
+# Main
+def main():
+    dictionaries, indexfile, outputfile, cachepath, queries, countOnly = processArgs()
+
+    # Construir o índice a partir dos dicionários indicados
+    if dictionaries:
+        cache = openCache(cachepath)
+        entries = buildIndex(readDictionaries(dictionaries), cache)
+        closeCache(cache)
+        saveIndex(entries, indexfile)
+        print('Indexed ' + str(len(entries)) + ' words (' + str(sum(len(c) for _, c in entries)) +
+              ' element sets) into ' + indexfile, file=sys.stderr)
+        if not queries and not countOnly:
+            return
+
+    # Pesquisar no índice
+    try:
+        index = loadIndex(indexfile)
+    except (OSError, ValueError) as e:
+        print('Element Index\nError: ' + str(e))
+        sys.exit(3)
+    found = queryIndex(index, queries.get('only'), queries.get('all'), queries.get('any'), queries.get('none'))
+
+    fout = sys.stdout if not outputfile else open(outputfile, 'w')
+    if countOnly:
+        fout.write(str(len(found)) + '\n')
+    else:
+        for row in found:
+            word, composition = getEntry(index, row)
+            fout.write(word + ': ' + '+'.join(composition) + '\n')
+    if outputfile:
+        fout.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/python3
+
+"""Build a latex file into a pdf, running pdflatex only as many times as needed.
+
+After each pdflatex pass the auxiliary files (.aux, .toc, ...) are compared with the ones the pass started from,
+and another pass is only run while they change (labels, references or table of contents not yet stable) or
+while the log asks for it. The files read by pdflatex (the latex file, images, packages, ...) and their hashes
+are recorded after a successful build, so that building again an unchanged document does nothing.
+"""
+
+import os
+import re
+import sys
+import json
+import getopt
+import hashlib
+import subprocess
+
+# Nº máximo de execuções do pdflatex numa compilação e extensões dos ficheiros auxiliares cujas alterações obrigam
+# a uma nova execução
+MAX_PASSES = 5
+AUX_EXTENSIONS = ['.aux', '.toc', '.lof', '.lot', '.out']
+RERUN_PATTERN = re.compile(rb'Rerun to get|Label\(s\) may have changed')
+
+
+# Processar argumentos do comando
+def processArgs():
+    shellEscape = False
+    force = False
+    maxPasses = MAX_PASSES
+    usage = 'Latex To Pdf\n' + \
+            'Usage:\n\tlatexToPdf [-f] [-m <passes>] [--shellescape] <latexfile>\n' + \
+            'Options:\n\t-f | --force\t\tBuilds the document even if it didn\'t change since the last build\n\t-m | --maxpasses\tUsed to indicate the maximum number of pdflatex passes (default 5)\n\t--shellescape\t\tRuns pdflatex with shell escape (\\write18)'
+
+    # Processar opções/argumentos do comando utilizado
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'fm:h', ['force', 'maxpasses=', 'shellescape', 'help'])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            print(usage)
+            sys.exit()
+        elif opt in ('-f', '--force'):
+            force = True
+        elif opt in ('-m', '--maxpasses'):
+            if not arg.isdigit() or int(arg) == 0:
+                print(usage)
+                sys.exit(2)
+            maxPasses = int(arg)
+        elif opt == '--shellescape':
+            shellEscape = True
+
+    if len(args) != 1:
+        print(usage)
+        sys.exit(2)
+
+    return args[0], shellEscape, force, maxPasses
+
+
+# Obter o hash do conteúdo de um ficheiro (None, se o ficheiro não existir)
+def hashFile(filename):
+    try:
+        fd = open(filename, 'rb')
+    except OSError:
+        return None
+    h = hashlib.sha256()
+    for block in iter(lambda: fd.read(1 << 16), b''):
+        h.update(block)
+    fd.close()
+    return h.hexdigest()
+
+
+# Obter os hashes dos ficheiros auxiliares de um documento
+def hashAuxFiles(jobname):
+    return [hashFile(jobname + ext) for ext in AUX_EXTENSIONS]
+
+
+# Verificar se o log da última execução do pdflatex pede uma nova execução
+def needsRerun(jobname):
+    try:
+        fd = open(jobname + '.log', 'rb')
+    except OSError:
+        return False
+    log = fd.read()
+    fd.close()
+    return RERUN_PATTERN.search(log) is not None
+
+
+# Obter os ficheiros lidos pelo pdflatex na última execução (registados no ficheiro .fls), excluindo os que
+# também foram escritos por ele (ficheiros auxiliares)
+def getInputs(jobname):
+    inputs = []
+    outputs = set()
+    try:
+        fd = open(jobname + '.fls', encoding='utf-8', errors='replace')
+    except OSError:
+        return inputs
+    for line in fd:
+        kind, _, path = line.rstrip('\n').partition(' ')
+        if kind == 'INPUT' and path not in inputs:
+            inputs.append(path)
+        elif kind == 'OUTPUT':
+            outputs.add(path)
+    fd.close()
+    return [path for path in inputs if path not in outputs]
+
+
+# Carregar o estado da última compilação bem sucedida de um documento (opções e hashes dos ficheiros lidos)
+def loadState(jobname):
+    try:
+        fd = open(jobname + '.build')
+        state = json.load(fd)
+        fd.close()
+        return state
+    except (OSError, ValueError):
+        return None
+
+
+# Guardar o estado de uma compilação bem sucedida de um documento
+def saveState(jobname, options):
+    state = {'options': options, 'inputs': {path: hashFile(path) for path in getInputs(jobname)}}
+    fd = open(jobname + '.build', 'w')
+    json.dump(state, fd)
+    fd.close()
+
+
+# Verificar se o pdf de um documento está atualizado, i.e., se foi compilado com as mesmas opções e nenhum dos
+# ficheiros então lidos foi alterado
+def isUpToDate(jobname, state, options):
+    if not state or state.get('options') != options or not os.path.isfile(jobname + '.pdf'):
+        return False
+    inputs = state.get('inputs', {})
+    return len(inputs) > 0 and all(hashFile(path) == h for path, h in inputs.items())
+
+
+# Compilar um documento latex, devolvendo o código de saída do pdflatex e o nº de execuções feitas (0, se o pdf já
+# estava atualizado)
+def buildDocument(texfile, shellEscape=False, force=False, maxPasses=MAX_PASSES):
+    jobname = os.path.splitext(os.path.basename(texfile))[0]
+    options = ['-recorder', '-interaction=batchmode'] + (['-shell-escape'] if shellEscape else [])
+
+    if not force and isUpToDate(jobname, loadState(jobname), options):
+        return 0, 0
+
+    passes = 0
+    while passes < maxPasses:
+        before = hashAuxFiles(jobname)
+        code = subprocess.run(['pdflatex'] + options + [texfile], stdout=subprocess.DEVNULL).returncode
+        passes += 1
+        if code != 0:
+            if os.path.isfile(jobname + '.build'):
+                os.remove(jobname + '.build')
+            return code, passes
+        if hashAuxFiles(jobname) == before and not needsRerun(jobname):
+            break
+
+    saveState(jobname, options)
+    return 0, passes
+
+
+# Main
+def main():
+    texfile, shellEscape, force, maxPasses = processArgs()
+    pdffile = os.path.splitext(os.path.basename(texfile))[0] + '.pdf'
+
+    try:
+        code, passes = buildDocument(texfile, shellEscape, force, maxPasses)
+    except FileNotFoundError:
+        print('Latex To Pdf\nError: pdflatex not found', file=sys.stderr)
+        sys.exit(127)
+
+    if code != 0:
+        print('Error: pdflatex failed building ' + pdffile + ' (see the log file)', file=sys.stderr)
+    elif passes == 0:
+        print(pdffile + ' is up to date')
+    else:
+        print('Built ' + pdffile + ' in ' + str(passes) + ' pass' + ('es' if passes > 1 else ''))
+    sys.exit(code)
+
+if __name__ == '__main__':
+    main()
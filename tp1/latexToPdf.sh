@@ -1,3 +0,0 @@
-#!/bin/bash
-pdflatex --shell-escape --interaction=batchmode $1
-pdflatex --shell-escape --interaction=batchmode $1
\ No newline at end of file
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+
+"""Periodic table resource used by chemicalLatex.
+
+The information about the chemical elements is kept in resources/periodic_table.info, a text file that is slow
+to parse. It is compiled into a JSON snapshot (periodic_table.json, next to it) which also records the snapshot
+format version and the modification time and size of the source file. The snapshot is loaded instead of the
+source file while it is up to date, and is rebuilt when it is missing or stale. Running this module compiles
+the snapshot ahead of time (build step): periodicTable [<infofile>]
+"""
+
+import os
+import re
+import sys
+import json
+
+# Versão do formato do snapshot (ao ser alterada, os snapshots existentes são reconstruídos)
+SNAPSHOT_VERSION = 1
+DEFAULT_PATH = 'resources/periodic_table.info'
+
+# Atributos de cada elemento químico e respetivos nomes no ficheiro da tabela periódica
+ATTRIBUTES = [('name', 'name'), ('appearance', 'appearance'), ('mass', 'atomic_mass'), ('category', 'category'),
+              ('density', 'density'), ('number', 'number'), ('period', 'period'), ('phase', 'phase'),
+              ('spectral_img', 'spectral_img'), ('summary', 'summary'), ('symbol', 'symbol'), ('xpos', 'xpos'),
+              ('ypos', 'ypos'), ('relative_position', 'relative_position')]
+
+
+# Obter a informação da tabela periódica e respetivos elementos químicos a partir de um ficheiro, cujo
+# conteúdo deve seguir uma estrutura específica (cada elemento é lido numa só passagem pelos seus atributos)
+def parsePeriodicTable(filename):
+    fd = open(filename)
+    content = fd.read()
+    fd.close()
+
+    periodic_table = {}
+    for element in re.findall(r'\{([^}]*)\}', content):
+        attributes = {}
+        for key, value in re.findall(r'(\w+): (.+)\n', element):
+            attributes.setdefault(key, value)
+
+        e = {attribute: attributes.get(key) for attribute, key in ATTRIBUTES}
+        e['relative_position'] = e['relative_position'] + ', ' if e['relative_position'] else ''
+        e['occurrences'] = 0
+        periodic_table[e['symbol'].lower()] = e
+
+    return dict(sorted(periodic_table.items(), key = lambda e: float(e[1]['number'])))
+
+
+# Obter o caminho do snapshot de um ficheiro da tabela periódica
+def getSnapshotPath(filename):
+    return os.path.splitext(filename)[0] + '.json'
+
+
+# Obter a identificação da versão de um ficheiro da tabela periódica (data de modificação e tamanho)
+def getSourceStamp(filename):
+    st = os.stat(filename)
+    return [st.st_mtime, st.st_size]
+
+
+# Compilar um ficheiro da tabela periódica no respetivo snapshot, devolvendo a tabela. Se o snapshot não puder ser
+# escrito (p.e. numa pasta de recursos sem permissão de escrita), a tabela é apenas devolvida
+def compilePeriodicTable(filename):
+    periodic_table = parsePeriodicTable(filename)
+    snapshot = {'version': SNAPSHOT_VERSION, 'source': getSourceStamp(filename), 'elements': periodic_table}
+    try:
+        fd = open(getSnapshotPath(filename), 'w')
+        json.dump(snapshot, fd, ensure_ascii=False)
+        fd.close()
+    except OSError:
+        pass
+    return periodic_table
+
+
+# Carregar a tabela periódica, a partir do snapshot, se estiver atualizado, ou do ficheiro original, que é então
+# compilado
+def loadPeriodicTable(filename):
+    try:
+        fd = open(getSnapshotPath(filename))
+        snapshot = json.load(fd)
+        fd.close()
+        if snapshot['version'] == SNAPSHOT_VERSION and snapshot['source'] == getSourceStamp(filename):
+            return snapshot['elements']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return compilePeriodicTable(filename)
+
+
+# Main
+def main():
+    filename = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    compilePeriodicTable(filename)
+    print('Compiled ' + filename + ' into ' + getSnapshotPath(filename))
+
+if __name__ == '__main__':
+    main()
@@ -34,15 +34,41 @@ def printInitDocument(fout, resourcespath):
             )
 
 
-# Imprimir nodos representantes de elementos químicos de uma lista
-def printChemElements(fout, composition, ptable):
-    effected_word = list(map(lambda elem: 
-        '\\scalebox{0.3}{\n'
-        '  \\centerfigure{\\begin{tikzpicture}[font=\\sffamily, transform shape]\n' + 
-        '    \\node[name=' + ptable[elem.lower()]['symbol'] + ', ' + ptable[elem.lower()]['category'] + ', rounded corners=.15cm, node distance=3cm] {\\hyperlink{subsubsection::' + ptable[elem.lower()]['symbol'] + '}{\\NaturalElementTextFormat{' + ptable[elem.lower()]['number'] + '}{' + str(round(float(ptable[elem.lower()]['mass']), 3)) + '}{' + ptable[elem.lower()]['symbol'] + '}{' + ptable[elem.lower()]['name'] + '}}};\n' +
-        '  \\end{tikzpicture}}\n' +
-        '}', composition))
-    fout.write('\n+\n'.join(effected_word))
+# Obter o nodo (caixa) que representa um elemento químico, construído apenas na primeira vez que é pedido
+def getElementNode(e):
+    if 'node' not in e:
+        e['node'] = '\\scalebox{0.3}{\n' + \
+            '  \\centerfigure{\\begin{tikzpicture}[font=\\sffamily, transform shape]\n' + \
+            '    \\node[name=' + e['symbol'] + ', ' + e['category'] + ', rounded corners=.15cm, node distance=3cm] {\\hyperlink{subsubsection::' + e['symbol'] + '}{\\NaturalElementTextFormat{' + e['number'] + '}{' + str(round(float(e['mass']), 3)) + '}{' + e['symbol'] + '}{' + e['name'] + '}}};\n' + \
+            '  \\end{tikzpicture}}\n' + \
+            '}'
+    return e['node']
+
+
+# Obter o texto dos nodos representantes de elementos químicos de uma lista. No modo compacto, cada elemento é
+# apenas uma referência à respetiva macro (\ChemH, \ChemO, ...), que tem de estar definida
+def renderChemElements(composition, ptable, compact=False):
+    elems = [ptable[elem.lower()] for elem in composition]
+    if not compact:
+        return '\n+\n'.join(getElementNode(e) for e in elems)
+    return '\n+\n'.join('\\Chem' + e['symbol'] + '{}' for e in elems)
+
+
+# Imprimir as definições das macros dos elementos químicos de uma lista que ainda não foram definidas
+def printChemMacros(fout, composition, ptable):
+    for elem in composition:
+        e = ptable[elem.lower()]
+        if not e.get('macro'):
+            fout.write('\\newcommand{\\Chem' + e['symbol'] + '}{' + getElementNode(e) + '}%\n')
+            e['macro'] = True
+
+
+# Imprimir nodos representantes de elementos químicos de uma lista. No modo compacto, cada elemento é definido
+# uma única vez como macro, antes da sua primeira ocorrência, sendo depois apenas referenciado
+def printChemElements(fout, composition, ptable, compact=False):
+    if compact:
+        printChemMacros(fout, composition, ptable)
+    fout.write(renderChemElements(composition, ptable, compact))
 
 
 # Imprimir notas de rodapé
@@ -154,13 +180,38 @@ def printFormulasOccurrencesApp(fout, formulas_found):
             fout.write('\\end{bchart}\n}\n\n\\newpage\n\n')
     
 
-# Imprimir informação dos elementos químicos nos apêndices
-def printElemsInfoApp(fout, resourcespath, ptable):
+# Imprimir tabela compacta de elementos químicos (nº, símbolo, nome, categoria e massa), com alvos de ligação para
+# cada elemento, de forma a que as ligações da tabela periódica e do texto continuem a funcionar
+def printElemsTable(fout, elems):
+    i = 0
+
+    fout.write('%% Other Chemical Elements\n' +
+                '\\subsubsection{Other Chemical Elements}\n\n')
+
+    for e in elems:
+        if i % 34 == 0:
+            if i > 0:
+                fout.write('\\end{tabular}\n\n\\newpage\n\n')
+            fout.write('\\begin{tabular}{r l l l r}\n' +
+                       '    \\textbf{Number} & \\textbf{Symbol} & \\textbf{Name} & \\textbf{Category} & \\textbf{Atomic Mass} \\\\\n' +
+                       '    \\hline\n')
+        fout.write('    \\hypertarget{subsubsection::' + e['symbol'] + '}{}' + e['number'] + ' & ' + e['symbol'] + ' & ' + e['name'] + ' & ' + e['category'] + ' & ' + str(round(float(e['mass']), 3)) + ' \\\\\n')
+        i += 1
+
+    if i > 0:
+        fout.write('\\end{tabular}\n\n')
+
+
+# Imprimir informação dos elementos químicos nos apêndices. No modo esparso, a informação detalhada é apenas
+# impressa para os elementos que ocorrem no texto, sendo os restantes resumidos numa tabela compacta
+def printElemsInfoApp(fout, ptable, spectral_images, sparse=False):
     fout.write('%% Chemical Elements Information\n' +
                 '\\subsection{Chemical Elements Information}\n' +
                 '\\label{anexo:elements_info}\n\n')
 
     for (k,v) in ptable.items():
+        if sparse and v['occurrences'] == 0:
+            continue
         fout.write('\\hypertarget{subsubsection::' + v['symbol'] + '}{}\\subsubsection{' + v['name'] + ' (' + v['symbol'] + ')}\n\n')
         if 'number' in v.keys() and v['number'] and v['number'] != 'null':
             fout.write('\\textit{Number}: ' + v['number'] + '\n\n')
@@ -188,13 +239,16 @@ def printElemsInfoApp(fout, resourcespath, ptable):
             fout.write('\\textit{Discovered By}: ' + v['discovered_by'] + '\n\n')
         if 'named_by' in v and v['named_by'] and v['named_by'] != 'null':
             fout.write('\\textit{Named By}: ' + v['named_by'] + '\n\n')
-        if 'spectral_img' in v and v['spectral_img'] and v['spectral_img'] != 'null':
-            fout.write('\\immediate\\write18{sudo wget -nc -nd -q -r -P ' + resourcespath + '/spectral_img -A jpeg,jpg,bmp,gif,png ' + v['spectral_img'] + '}\n' +
-                '\\begin{figure}[!ht]\n    \\centering\n    \\includegraphics[width=12cm]{' + resourcespath + '/spectral_img/' + v['spectral_img'].split('/')[-1] + '}\n    \\caption{' + v['name'] + ' Spectral Image}\n\\end{figure}\n\n')
+        if k in spectral_images:
+            fout.write('\\begin{figure}[!ht]\n    \\centering\n    \\includegraphics[width=12cm]{' + spectral_images[k] + '}\n    \\caption{' + v['name'] + ' Spectral Image}\n\\end{figure}\n\n')
+
+    if sparse:
+        printElemsTable(fout, [v for v in ptable.values() if v['occurrences'] == 0])
 
 
-# Imprimir fim do documento latex (com apêndices)
-def printEndDocument(fout, resourcespath, ptable, formulas_found):
+# Imprimir fim do documento latex (com apêndices). As imagens espectrais dos elementos são as guardadas localmente
+# (ver spectralImages)
+def printEndDocument(fout, ptable, formulas_found, spectral_images, sparse=False):
     # Apendices
     fout.write('\n\\setcounter{section}{0}\n' +
                 '\\setcounter{subsection}{0}\n\n' +
@@ -210,6 +264,6 @@ def printEndDocument(fout, resourcespath, ptable, formulas_found):
     printPeriodicTableApp(fout, ptable)
     printElemsOccurrencesApp(fout, ptable)
     printFormulasOccurrencesApp(fout, formulas_found)
-    printElemsInfoApp(fout, resourcespath, ptable)
+    printElemsInfoApp(fout, ptable, spectral_images, sparse)
     
     fout.write('\\end{document}\n')
\ No newline at end of file
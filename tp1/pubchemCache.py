@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+
+"""Persistent cache for the PubChem information of chemical formulas.
+
+It is used by chemicalLatex to avoid repeating the PubChem searches of formulas already looked up in previous
+runs. Both formulas with information (positive results) and formulas without it (negative results) are kept
+on disk (sqlite) for a limited time (TTL). In offline mode PubChem is never searched and the cached results are
+used regardless of their age.
+"""
+
+import os
+import sys
+import time
+import sqlite3
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'chemical', 'pubchem.db')
+DEFAULT_TTL = 30 * 24 * 60 * 60
+
+
+# Abrir a cache de pesquisas no pubchem (vazia, se não for indicado ficheiro ou se este não puder ser aberto)
+def openFormulaCache(path=DEFAULT_PATH, ttl=DEFAULT_TTL, offline=False):
+    db = None
+    if path:
+        try:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute('CREATE TABLE IF NOT EXISTS formulas (formula TEXT PRIMARY KEY, info TEXT, time REAL)')
+            db.commit()
+        except (OSError, sqlite3.Error) as e:
+            print('Warning: PubChem cache not available (' + str(e) + ')', file=sys.stderr)
+            db = None
+
+    return {'db': db, 'ttl': ttl, 'offline': offline}
+
+
+# Obter a informação guardada de uma fórmula (texto vazio se a fórmula não tiver informação no pubchem). Devolve
+# None se a fórmula não estiver na cache ou se o resultado tiver expirado, exceto em modo offline ou se forem
+# aceites resultados expirados (stale), em que se devolve o resultado guardado ou, não existindo, texto vazio
+def getFormulaInfo(cache, formula, stale=False):
+    row = None
+    if cache['db']:
+        row = cache['db'].execute('SELECT info, time FROM formulas WHERE formula = ?', (formula,)).fetchone()
+
+    if cache['offline'] or stale:
+        return row[0] if row else ''
+    if row and time.time() - row[1] < cache['ttl']:
+        return row[0]
+    return None
+
+
+# Guardar a informação de uma fórmula obtida no pubchem
+def storeFormulaInfo(cache, formula, info):
+    if cache['db']:
+        cache['db'].execute('INSERT OR REPLACE INTO formulas VALUES (?, ?, ?)', (formula, info, time.time()))
+        cache['db'].commit()
+
+
+# Fechar a cache de pesquisas no pubchem
+def closeFormulaCache(cache):
+    if cache['db']:
+        cache['db'].close()
+        cache['db'] = None
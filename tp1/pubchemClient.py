@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+
+"""Batched PubChem PUG REST client used by chemicalLatex.
+
+The CIDs of each formula are searched by name and by formula, concurrently, and the properties and synonyms of
+all the CIDs found are then obtained with a few batched requests. Requests go through persistent (keep-alive)
+HTTP connections, one per thread, so the connection is reused between requests.
+"""
+
+import json
+import threading
+import http.client
+from urllib.parse import urlsplit, urlencode, quote
+from concurrent.futures import ThreadPoolExecutor
+
+API_BASE = 'https://pubchem.ncbi.nlm.nih.gov/rest/pug'
+BATCH_SIZE = 100
+PROPERTIES = ['IUPACName', 'MolecularFormula', 'MolecularWeight', 'ExactMass', 'MonoisotopicMass', 'Complexity']
+
+
+# Erro num pedido ao pubchem (resposta de erro ou falha na ligação)
+class PubChemError(Exception):
+    pass
+
+
+# Abrir uma sessão com o pubchem, que mantém uma ligação persistente por thread
+def openSession(apiBase=API_BASE):
+    url = urlsplit(apiBase.rstrip('/'))
+    return {'scheme': url.scheme, 'host': url.netloc, 'path': url.path, 'local': threading.local(),
+            'connections': [], 'lock': threading.Lock()}
+
+
+# Obter a ligação da thread atual, criando-a se ainda não existir
+def getConnection(session):
+    conn = getattr(session['local'], 'conn', None)
+    if conn is None:
+        if session['scheme'] == 'https':
+            conn = http.client.HTTPSConnection(session['host'], timeout=60)
+        else:
+            conn = http.client.HTTPConnection(session['host'], timeout=60)
+        session['local'].conn = conn
+        with session['lock']:
+            session['connections'].append(conn)
+    return conn
+
+
+# Fazer um pedido ao pubchem (POST, se forem enviados dados) e devolver a resposta em JSON, ou None se nada for
+# encontrado. Caso a ligação persistente tenha sido fechada pelo servidor, o pedido é repetido numa ligação nova
+def requestJSON(session, path, data=None):
+    body = urlencode(data).encode() if data else None
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'} if data else {}
+
+    for attempt in range(2):
+        conn = getConnection(session)
+        try:
+            conn.request('POST' if body else 'GET', session['path'] + path, body, headers)
+            response = conn.getresponse()
+            content = response.read()
+            break
+        except (http.client.HTTPException, OSError) as e:
+            conn.close()
+            session['local'].conn = None
+            if attempt == 1:
+                raise PubChemError(str(e))
+
+    if response.status == 404:
+        return None
+    if response.status != 200:
+        raise PubChemError('PubChem answered with status ' + str(response.status))
+    return json.loads(content.decode())
+
+
+# Obter os CIDs encontrados para um identificador num namespace (p.e. 'name' ou 'fastformula')
+def getCids(session, namespace, identifier):
+    if namespace == 'name':
+        result = requestJSON(session, '/compound/name/cids/JSON', {'name': identifier})
+    else:
+        result = requestJSON(session, '/compound/' + namespace + '/' + quote(identifier) + '/cids/JSON')
+    return result['IdentifierList'].get('CID', []) if result and 'IdentifierList' in result else []
+
+
+# Obter os CIDs dos compostos que têm a fórmula indicada como nome e como fórmula (None, se a pesquisa falhar)
+def findFormulaCids(session, formula):
+    try:
+        return sorted(set(getCids(session, 'name', formula)).intersection(getCids(session, 'fastformula', formula)))
+    except PubChemError:
+        return None
+
+
+# Obter as propriedades e os sinónimos de vários compostos, em pedidos de BATCH_SIZE CIDs
+def getCompounds(session, cids):
+    compounds = {}
+    for start in range(0, len(cids), BATCH_SIZE):
+        batch = {'cid': ','.join(str(cid) for cid in cids[start:start+BATCH_SIZE])}
+        properties = requestJSON(session, '/compound/cid/property/' + ','.join(PROPERTIES) + '/JSON', batch)
+        synonyms = requestJSON(session, '/compound/cid/synonyms/JSON', batch)
+
+        for p in properties['PropertyTable']['Properties'] if properties else []:
+            compounds[p['CID']] = {
+                'iupac_name': p.get('IUPACName'),
+                'molecular_formula': p.get('MolecularFormula'),
+                'molecular_weight': float(p['MolecularWeight']) if p.get('MolecularWeight') else None,
+                'exact_mass': float(p['ExactMass']) if p.get('ExactMass') else None,
+                'monoisotopic_mass': float(p['MonoisotopicMass']) if p.get('MonoisotopicMass') else None,
+                'complexity': p.get('Complexity'),
+                'synonyms': []
+            }
+        for s in synonyms['InformationList']['Information'] if synonyms else []:
+            if s['CID'] in compounds:
+                compounds[s['CID']]['synonyms'] = s.get('Synonym', [])
+
+    return compounds
+
+
+# Pesquisar várias fórmulas no pubchem: os CIDs de cada fórmula são pesquisados concorrentemente (num pool de
+# lookups threads) e os compostos encontrados são obtidos em pedidos agrupados. Devolve, para cada fórmula cuja
+# pesquisa não falhou, a lista dos seus compostos (vazia, se a fórmula não foi encontrada)
+def searchFormulas(session, formulas, lookups=4):
+    with ThreadPoolExecutor(max_workers=lookups) as pool:
+        found = dict(zip(formulas, pool.map(lambda f: findFormulaCids(session, f), formulas)))
+
+    cids = sorted({cid for c in found.values() if c for cid in c})
+    try:
+        compounds = getCompounds(session, cids)
+    except PubChemError:
+        return {f: [] for f, c in found.items() if c == []}
+
+    return {f: [compounds[cid] for cid in c if cid in compounds] for f, c in found.items() if c is not None}
+
+
+# Fechar as ligações abertas pela sessão
+def closeSession(session):
+    with session['lock']:
+        for conn in session['connections']:
+            conn.close()
+        session['connections'] = []
@@ -0,0 +1,180 @@
+#!/usr/bin/python3
+
+"""Local stand-in for the PubChem PUG REST service.
+
+It answers, from a JSON file of sample compounds, the requests made by chemicalLatex (searches of CIDs by name
+and by formula, and batches of properties and synonyms), so that chemicalLatex can be run and tested without network
+access (chemicalLatex --pubchem http://localhost:<port>/rest/pug).
+"""
+
+import os
+import re
+import sys
+import json
+import getopt
+import threading
+from collections import Counter
+from urllib.parse import unquote, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+API_PATH = '/rest/pug'
+DEFAULT_PORT = 8008
+BASEDIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIXTURE = BASEDIR + '/resources/pubchem_sample.json'
+
+
+# Processar argumentos do comando
+def processArgs():
+    port = DEFAULT_PORT
+    fixture = DEFAULT_FIXTURE
+    usage = 'pubchemServer [-p <port>] [-f <fixturefile>]'
+
+    # Processar opções/argumentos do comando utilizado
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'p:f:h', ['port=', 'fixture=', 'help'])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            print(usage)
+            sys.exit()
+        elif opt in ('-p', '--port'):
+            port = int(arg)
+        elif opt in ('-f', '--fixture'):
+            fixture = arg
+
+    return port, fixture
+
+
+# Normalizar uma fórmula química (nº de átomos de cada elemento), de forma a que fórmulas equivalentes escritas
+# por ordens diferentes (p.e. NaCl e ClNa) sejam iguais
+def normalizeFormula(formula):
+    counts = Counter()
+    for symbol, n in re.findall(r'([A-Z][a-z]?)(\d*)', formula):
+        counts[symbol] += int(n) if n else 1
+    return tuple(sorted(counts.items()))
+
+
+# Carregar os compostos de exemplo e construir os índices de pesquisa por nome e por fórmula
+def loadFixture(filename):
+    fd = open(filename)
+    compounds = {int(cid): c for cid, c in json.load(fd)['compounds'].items()}
+    fd.close()
+
+    names = {}
+    formulas = {}
+    for cid, c in sorted(compounds.items()):
+        for name in [c['iupac_name']] + c['synonyms']:
+            names.setdefault(name.lower(), []).append(cid)
+        formulas.setdefault(normalizeFormula(c['molecular_formula']), []).append(cid)
+
+    return {'compounds': compounds, 'names': names, 'formulas': formulas}
+
+
+# Construir a linha de um composto na tabela de propriedades devolvida pelo pubchem
+def buildProperties(cid, c, properties):
+    values = {'IUPACName': c['iupac_name'], 'MolecularFormula': c['molecular_formula'],
+              'MolecularWeight': c['molecular_weight'], 'ExactMass': c['exact_mass'],
+              'MonoisotopicMass': c['monoisotopic_mass'], 'Complexity': c['complexity']}
+    return dict([('CID', cid)] + [(p, values[p]) for p in properties if p in values])
+
+
+# Obter a resposta (código e conteúdo) a um pedido, dados o namespace, o identificador e a operação pedidos (e,
+# nos pedidos de propriedades, a lista de propriedades separadas por vírgulas)
+def resolveRequest(fixture, namespace, identifier, operation, properties=''):
+    notFound = (404, {'Fault': {'Code': 'PUGREST.NotFound', 'Message': 'No CID found'}})
+
+    # Pesquisas de CIDs por nome e por fórmula (pesquisa rápida, que devolve logo os CIDs)
+    if namespace in ('fastformula', 'name'):
+        if namespace == 'fastformula':
+            cids = fixture['formulas'].get(normalizeFormula(identifier), [])
+        else:
+            cids = fixture['names'].get(identifier.lower(), [])
+        if not cids or operation != 'cids':
+            return notFound
+        return 200, {'IdentifierList': {'CID': cids}}
+
+    # Pedidos sobre CIDs: propriedades ou sinónimos
+    if namespace == 'cid':
+        cids = [int(cid) for cid in identifier.split(',') if cid.isdigit() and int(cid) in fixture['compounds']]
+        if not cids:
+            return notFound
+        if operation == 'synonyms':
+            return 200, {'InformationList': {'Information': [
+                {'CID': cid, 'Synonym': fixture['compounds'][cid]['synonyms']} for cid in cids]}}
+        if operation == 'property' and properties:
+            return 200, {'PropertyTable': {'Properties': [
+                buildProperties(cid, fixture['compounds'][cid], properties.split(',')) for cid in cids]}}
+
+    return 400, {'Fault': {'Code': 'PUGREST.BadRequest', 'Message': 'Unsupported request'}}
+
+
+# Criar a classe que responde aos pedidos HTTP (GET e POST) com os compostos indicados
+def buildHandler(fixture):
+    class PubChemHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self.answer({})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            self.answer(parse_qs(self.rfile.read(length).decode()))
+
+        def answer(self, form):
+            # Os pedidos têm a forma <API_PATH>/compound/<namespace>[/<identificador>][/<operação>[/<propriedades>]]/JSON,
+            # sendo o identificador enviado no corpo do pedido nos pedidos POST
+            path = self.path.split('?')[0]
+            parts = [unquote(p) for p in path[len(API_PATH):].strip('/').split('/')] if path.startswith(API_PATH) else []
+            if len(parts) >= 3 and parts[0] == 'compound' and parts[-1] == 'JSON':
+                namespace = parts[1]
+                rest = parts[2:-1]
+                if namespace in form:
+                    identifier = form[namespace][0]
+                else:
+                    identifier = rest.pop(0) if rest else ''
+                status, body = resolveRequest(fixture, namespace, identifier, rest[0] if rest else None,
+                                              rest[1] if len(rest) > 1 else '')
+            else:
+                status, body = 400, {'Fault': {'Code': 'PUGREST.BadRequest', 'Message': 'Unsupported request'}}
+
+            content = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    return PubChemHandler
+
+
+# Criar o servidor (porto 0: porto livre escolhido pelo sistema), devolvendo o servidor e o URL base da API, a
+# usar no chemicalLatex
+def createServer(fixturefile=DEFAULT_FIXTURE, port=0):
+    server = ThreadingHTTPServer(('localhost', port), buildHandler(loadFixture(fixturefile)))
+    return server, 'http://localhost:' + str(server.server_address[1]) + API_PATH
+
+
+# Iniciar o servidor numa thread, devolvendo o servidor e o URL base da API
+def startServer(fixturefile=DEFAULT_FIXTURE, port=0):
+    server, url = createServer(fixturefile, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, url
+
+
+# Main
+def main():
+    port, fixture = processArgs()
+    server, url = createServer(fixture, port)
+    print('PubChem stand-in serving on ' + url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+
+"""Local store of the spectral images of the chemical elements.
+
+The spectral images referenced by the periodic table are kept in resources/spectral_img, together with a
+manifest (manifest.json) with the URL, the SHA-256 and the stored file of each image. chemicalLatex only
+references images that are stored locally and whose content matches the manifest, so building the generated
+latex needs neither network access nor shell escape. Missing or damaged images are downloaded (unless offline)
+and only kept if they are png or jpeg images matching the hash already in the manifest, and images with the same
+content are stored only once. Running this module pre-populates the store: spectralImages [-r <resources>] [--offline]
+"""
+
+import os
+import sys
+import json
+import getopt
+import hashlib
+from periodicTable import loadPeriodicTable
+
+MANIFEST = 'manifest.json'
+TIMEOUT = 30
+
+# Assinaturas dos formatos de imagem que o pdflatex consegue incluir (png e jpeg)
+IMAGE_SIGNATURES = [b'\x89PNG\r\n\x1a\n', b'\xff\xd8\xff']
+
+
+# Processar argumentos do comando
+def processArgs():
+    resourcespath = 'resources'
+    offline = False
+    usage = 'spectralImages [-r <resourcesfolder>] [--offline]'
+
+    # Processar opções/argumentos do comando utilizado
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'r:h', ['resources=', 'offline', 'help'])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            print(usage)
+            sys.exit()
+        elif opt in ('-r', '--resources'):
+            resourcespath = arg.rstrip('/')
+        elif opt == '--offline':
+            offline = True
+
+    return resourcespath, offline
+
+
+# Carregar o manifesto das imagens guardadas numa pasta (vazio, se não existir)
+def loadManifest(folder):
+    try:
+        fd = open(os.path.join(folder, MANIFEST))
+        manifest = json.load(fd)
+        fd.close()
+        return manifest
+    except (OSError, ValueError):
+        return {}
+
+
+# Guardar o manifesto das imagens guardadas numa pasta
+def saveManifest(folder, manifest):
+    fd = open(os.path.join(folder, MANIFEST), 'w')
+    json.dump(manifest, fd, indent=1, sort_keys=True)
+    fd.write('\n')
+    fd.close()
+
+
+# Ler o conteúdo de um ficheiro (None, se não existir)
+def readFile(filename):
+    try:
+        fd = open(filename, 'rb')
+    except OSError:
+        return None
+    content = fd.read()
+    fd.close()
+    return content
+
+
+# Verificar se um conteúdo é uma imagem que pode ser incluída no documento
+def isImage(content):
+    return content is not None and any(content.startswith(s) for s in IMAGE_SIGNATURES)
+
+
+# Descarregar uma imagem (None, se o pedido falhar). O urllib só é importado quando é preciso descarregar imagens
+def downloadImage(url):
+    from urllib.request import urlopen
+    try:
+        response = urlopen(url, timeout=TIMEOUT)
+        content = response.read()
+        response.close()
+        return content
+    except (OSError, ValueError):
+        return None
+
+
+# Guardar uma imagem numa pasta, escrevendo-a primeiro num ficheiro temporário, de forma a que uma escrita
+# interrompida não deixe uma imagem incompleta
+def storeImage(folder, name, content):
+    os.makedirs(folder, exist_ok=True)
+    tmpname = os.path.join(folder, '.' + name + '.tmp')
+    fd = open(tmpname, 'wb')
+    fd.write(content)
+    fd.close()
+    os.replace(tmpname, os.path.join(folder, name))
+
+
+# Obter as imagens espectrais dos elementos da tabela periódica, guardadas na pasta spectral_img dos recursos,
+# devolvendo, para cada elemento cuja imagem está disponível, o caminho da mesma. As imagens em falta ou cujo
+# conteúdo não corresponde ao manifesto são descarregadas (se download for verdadeiro)
+def syncSpectralImages(resourcespath, ptable, download=True):
+    folder = resourcespath + '/spectral_img'
+    manifest = loadManifest(folder)
+    verified = {}
+    images = {}
+    changed = False
+
+    # Ficheiros guardados cujo conteúdo corresponde ao manifesto (indexados pelo hash do conteúdo)
+    for entry in manifest.values():
+        if entry['file'] not in verified.values():
+            content = readFile(os.path.join(folder, entry['file']))
+            if content is not None and hashlib.sha256(content).hexdigest() == entry['sha256']:
+                verified[entry['sha256']] = entry['file']
+
+    for key, e in ptable.items():
+        url = e['spectral_img']
+        if not url or url == 'null':
+            continue
+        name = url.split('/')[-1]
+        entry = manifest.get(name)
+
+        # Imagem já guardada e válida
+        if entry and verified.get(entry['sha256']) == entry['file']:
+            images[key] = folder + '/' + entry['file']
+            continue
+
+        # Imagem por guardar ou danificada: usa-se o ficheiro local, se for uma imagem ainda sem registo no
+        # manifesto, ou descarrega-se a imagem, que tem de ter o hash registado no manifesto (se existir)
+        content = readFile(os.path.join(folder, name)) if not entry else None
+        if not isImage(content):
+            content = downloadImage(url) if download else None
+        if not isImage(content):
+            continue
+        h = hashlib.sha256(content).hexdigest()
+        if entry and entry['sha256'] != h:
+            print('Warning: spectral image ' + name + ' doesn\'t match its manifest entry', file=sys.stderr)
+            continue
+
+        # Imagens com o mesmo conteúdo são guardadas apenas uma vez
+        try:
+            if h not in verified:
+                storeImage(folder, name, content)
+                verified[h] = name
+        except OSError as e:
+            print('Warning: spectral image ' + name + ' not stored (' + str(e) + ')', file=sys.stderr)
+            continue
+        manifest[name] = {'url': url, 'sha256': h, 'file': verified[h]}
+        images[key] = folder + '/' + verified[h]
+        changed = True
+
+    if changed:
+        try:
+            saveManifest(folder, manifest)
+        except OSError as e:
+            print('Warning: spectral images manifest not saved (' + str(e) + ')', file=sys.stderr)
+
+    return images
+
+
+# Remover da pasta das imagens os ficheiros duplicados (com o mesmo conteúdo de uma imagem do manifesto, mas que não
+# são o ficheiro registado para ela)
+def pruneSpectralImages(resourcespath):
+    folder = resourcespath + '/spectral_img'
+    manifest = loadManifest(folder)
+    stored = {entry['file'] for entry in manifest.values()}
+    hashes = {entry['sha256'] for entry in manifest.values()}
+    removed = 0
+
+    for name in sorted(os.listdir(folder)):
+        if name == MANIFEST or name in stored:
+            continue
+        content = readFile(os.path.join(folder, name))
+        if content is not None and hashlib.sha256(content).hexdigest() in hashes:
+            os.remove(os.path.join(folder, name))
+            removed += 1
+
+    return removed
+
+
+# Main
+def main():
+    resourcespath, offline = processArgs()
+    ptable = loadPeriodicTable(resourcespath + '/periodic_table.info')
+    images = syncSpectralImages(resourcespath, ptable, download=not offline)
+    removed = pruneSpectralImages(resourcespath)
+
+    total = len([e for e in ptable.values() if e['spectral_img'] and e['spectral_img'] != 'null'])
+    print(str(len(images)) + '/' + str(total) + ' spectral images available in ' + resourcespath + '/spectral_img' +
+          (' (' + str(removed) + ' duplicates removed)' if removed else ''))
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,10 @@ output to file or the terminal. This output can be: a table with information abo
 chart with POS tag frequence, a text tagged with entities or a dependency graph.
 
 Multi-language support via the -l/--lang parameter.
+
+Large input files can be processed in chunked mode (-c/--chunked): the input is split into paragraphs,
+read as needed, and streamed through nlp.pipe (with a configurable batch size and number of
+processes), the outputs being aggregated over all the paragraphs in a single pass over the input.
 '''
 
 import os
@@ -18,10 +22,15 @@ import json
 import spacy
 from flask import Flask, request, url_for, redirect, render_template
 from .pos_tagging import add_tokenizer_exceptions, generate_tagged_text, generate_information, \
-generate_pos_chart, generate_dependencies_graph
+generate_pos_chart, generate_dependencies_graph, count_pos, pos_chart, collect_information, \
+information_table, tag_words, render_dependencies
+from .models import MODELS, create_registry, get_model, preload_models
 
 APP = Flask(__name__)
 
+# Default number of paragraphs processed by nlp.pipe in each batch (chunked mode)
+BATCH_SIZE = 100
+
 @APP.route('/', methods=['GET', 'POST'])
 def index():
     '''
@@ -32,10 +41,11 @@ def index():
         APP.config['LANG'] = request.values.get('lang')
         entities = request.form.getlist('entity')
         token_exceptions = json.loads(request.values.get('tokenExceptions'))
-        add_tokenizer_exceptions(APP.config['NLP'][APP.config['LANG']], token_exceptions)
-        doc = APP.config['NLP'][APP.config['LANG']](request.values.get('input'))
+        nlp = get_model(APP.config['NLP'], APP.config['LANG'])
+        add_tokenizer_exceptions(nlp, token_exceptions)
+        doc = nlp(request.values.get('input'))
         APP.config['TAGGED_TEXT'] = generate_tagged_text(doc, style='html', entities=entities)
-        APP.config['INFO'] = generate_information(doc, APP.config['NLP'][APP.config['LANG']].vocab)
+        APP.config['INFO'] = generate_information(doc, nlp.vocab)
         APP.config['BAR_CHART'] = generate_pos_chart(doc, None, style='html')
         APP.config['GRAPHS'] = '\n'.join(generate_dependencies_graph(doc, style='html'))
         return redirect(url_for('tagged_text_form'))
@@ -76,41 +86,106 @@ def graphs_form():
     return render_template('graphs_form.html', graphs=APP.config['GRAPHS'])
 
 
+def read_paragraphs(inp, max_length):
+    '''
+    Splits the input into paragraphs (separated by blank lines), read as needed. Paragraphs longer
+    than max_length characters (spaCy's limit) are split at line boundaries (or inside longer lines).
+    '''
+    lines = []
+    size = 0
+    for line in inp:
+        if not line.strip():
+            if lines:
+                yield ''.join(lines)
+            lines = []
+            size = 0
+            continue
+        if lines and size + len(line) > max_length:
+            yield ''.join(lines)
+            lines = []
+            size = 0
+        while len(line) > max_length:
+            yield line[:max_length]
+            line = line[max_length:]
+        lines.append(line)
+        size += len(line)
+    if lines:
+        yield ''.join(lines)
+
+
+def stream_docs(nlp, inputfile, batch_size=BATCH_SIZE, n_process=1):
+    '''
+    Streams the docs of the paragraphs of the input file, processed by nlp.pipe.
+    '''
+    options = {'batch_size': batch_size}
+    if n_process > 1:
+        options['n_process'] = n_process
+    with open(inputfile, 'r') as inp:
+        yield from nlp.pipe(read_paragraphs(inp, nlp.max_length), **options)
+
+
 def spacys_features(arguments):
     '''
     Provides spacy's features on command line and web interface.
     '''
-    info_out, pos_chart_out, tagged_text_out, graphs_out, lang, inputfile = arguments
+    info_out, pos_chart_out, tagged_text_out, graphs_out, lang, inputfile, chunked, batch_size, \
+    n_process, preload, memory_budget = arguments
     if inputfile:
-        nlp = {'en': 'en_core_web_lg', 'pt': 'pt'}
-        nlp = spacy.load(nlp[lang])
-        with open(inputfile, 'r') as inp:
-            doc = nlp(inp.read())
+        nlp = spacy.load(MODELS[lang])
+        if chunked:
+            docs = stream_docs(nlp, inputfile, batch_size, n_process)
+        else:
+            with open(inputfile, 'r') as inp:
+                docs = [nlp(inp.read())]
+
+        # All the requested outputs are gathered in a single pass over the docs, so that in chunked
+        # mode the input is only parsed once and no more than a batch of docs is kept in memory. The
+        # tagged text and the graphs are written as the docs arrive; the table of tokens needs all its
+        # rows to lay out its columns, so it grows with the input
+        information = None
+        pos_counts = None
+        tagged_file = None
+        separator = ''
+        graphs = 0
+        if tagged_text_out:
+            tagged_file = sys.stdout if tagged_text_out == 'shell' else open(tagged_text_out, 'w')
+        if graphs_out:
+            os.makedirs('./images', exist_ok=True)
+        for doc in docs:
+            if info_out:
+                information = collect_information(doc, nlp.vocab, information)
+            if pos_chart_out:
+                pos_counts = count_pos(doc, pos_counts)
+            if tagged_file:
+                tagged_words = tag_words(doc)
+                if tagged_words:
+                    tagged_file.write(separator + ' '.join(tagged_words))
+                    separator = ' '
+            if graphs_out:
+                for pict in render_dependencies(doc):
+                    output_path = Path('./images/' + graphs_out + '_' + str(graphs) + '.svg')
+                    with output_path.open('w', encoding='utf-8') as file_descriptor:
+                        file_descriptor.write(pict)
+                    graphs += 1
+
+        if tagged_file is sys.stdout:
+            print()
+        elif tagged_file:
+            tagged_file.close()
+
         if info_out:
-            output = generate_information(doc, nlp.vocab, 'text')
+            output = information_table(information, 'text')
             if info_out == 'shell':
                 print(output)
             else:
                 with open(info_out, 'w') as file_descriptor:
-                    file_descriptor.write(output)
+                    file_descriptor.write(str(output))
         if pos_chart_out:
-            generate_pos_chart(doc, pos_chart_out, style='pict')
-        if tagged_text_out:
-            output = generate_tagged_text(doc, 'text', nlp.vocab)
-            if tagged_text_out == 'shell':
-                print(output)
-            else:
-                with open(tagged_text_out, 'w') as file_descriptor:
-                    file_descriptor.write(output)
-        if graphs_out:
-            os.makedirs('./images', exist_ok=True)
-            output = generate_dependencies_graph(doc, 'pict')
-            for i, pict in enumerate(output):
-                output_path = Path('./images/' + graphs_out + '_' + str(i) + '.svg')
-                with output_path.open('w', encoding='utf-8') as file_descriptor:
-                    file_descriptor.write(pict)
+            pos_chart(pos_counts, pos_chart_out, style='pict')
     else:
-        APP.config['NLP'] = {'en': spacy.load('en_core_web_lg'), 'pt': spacy.load('pt')}
+        # Models are only loaded when first used (or pre-warmed), within the memory budget
+        APP.config['NLP'] = create_registry(memory_budget)
+        preload_models(APP.config['NLP'], preload)
         APP.config['LANG'] = 'pt'
         APP.config['TAGGED_TEXT'] = ''
         APP.config['INFO'] = ''
@@ -129,22 +204,35 @@ def process_args():
     graphs_out = ''
     lang = 'pt'
     inputfile = ''
+    chunked = False
+    batch_size = BATCH_SIZE
+    n_process = 1
+    preload = []
+    memory_budget = None
 
     error = 'USAGE:\tspacys_features app.py [(-i <outputfile> | -p <outputfile> | -t <outputfile> | ' + \
-            '-g <outputfile>) [-l <language>] <inputfile>]\n\n' + \
+            '-g <outputfile>) [-l <language>] [-c [-b <batchsize>] [-n <processes>]] <inputfile>]\n' + \
+            '\tspacys_features app.py [--preload <languages>] [--memory <megabytes>]\n\n' + \
             'OPTIONS:\n' + \
             '\t-l\tlanguage - \'pt\' (default) or \'en\'\n' + \
-            '\t-i\treturns table with information about tokens to outputfile (or \'shell\')\n' + \
+            '\t-c\tchunked mode - processes the input paragraph by paragraph (for large inputs)\n' + \
+            '\t-b\tnumber of paragraphs processed in each batch in chunked mode (default 100)\n' + \
+            '\t-n\tnumber of processes used in chunked mode (default 1)\n' + \
+            '\t-i\treturns table with information about tokens to outputfile (or \'shell\'),\n' + \
+            '\t\tkept in memory until the whole input is read (even in chunked mode)\n' + \
             '\t-p\tgenerates bar chart with POS tag frequence to outputfile\n' + \
             '\t-t\treturns tagged text to outputfile (or \'shell\')\n' + \
             '\t-g\tgenerates dependencies graphs to outputfile.svg\n' +\
+            '\t--preload\tcomma separated languages whose models are loaded when the web server starts\n' + \
+            '\t--memory\tmemory budget (MB) of the web server\'s models, the least recently used being unloaded\n' + \
             '* if no options are provided, a web server will be initialized, where the input ' + \
-            'will be inserted and the output presented.'
+            'will be inserted and the output presented (each language\'s model is loaded when first used).'
 
     # Processar opções/argumentos do comando utilizado
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "i:p:t:g:l:hv",
+        opts, args = getopt.getopt(sys.argv[1:], "i:p:t:g:l:cb:n:hv",
                                    ["info=", "pos-chart=", "tagged-text=", "graphs=", "lang=",
+                                    "chunked", "batch-size=", "n-process=", "preload=", "memory=",
                                     "help", "version"]
                                    )
     except getopt.GetoptError:
@@ -167,6 +255,27 @@ def process_args():
             graphs_out = arg
         elif opt in ("-l", "--lang"):
             lang = arg
+        elif opt in ("-c", "--chunked"):
+            chunked = True
+        elif opt in ("-b", "--batch-size", "-n", "--n-process"):
+            if not arg.isdigit() or int(arg) == 0:
+                print(error)
+                sys.exit(2)
+            chunked = True
+            if opt in ("-b", "--batch-size"):
+                batch_size = int(arg)
+            else:
+                n_process = int(arg)
+        elif opt == "--preload":
+            preload = [l for l in arg.split(',') if l]
+            if any(l not in MODELS for l in preload):
+                print(error)
+                sys.exit(2)
+        elif opt == "--memory":
+            if not arg.isdigit() or int(arg) == 0:
+                print(error)
+                sys.exit(2)
+            memory_budget = int(arg) * 1024 * 1024
 
     if (info_out or pos_chart_out or tagged_text_out or graphs_out) and len(args) == 1:
         inputfile = args[0]
@@ -174,7 +283,8 @@ def process_args():
         print(error)
         sys.exit(2)
 
-    spacys_features((info_out, pos_chart_out, tagged_text_out, graphs_out, lang, inputfile))
+    spacys_features((info_out, pos_chart_out, tagged_text_out, graphs_out, lang, inputfile, chunked,
+                     batch_size, n_process, preload, memory_budget))
 
 
 __author__ = "João Barreira, Mafalda Nunes"
@@ -0,0 +1,91 @@
+# coding=utf-8
+#!/usr/bin/python3
+
+''' Registry of the spaCy models used by the web app
+
+The model of each language is only loaded the first time it is used (or when the registry is
+pre-warmed with a list of languages). When a memory budget is configured, the least recently used
+models are evicted so that the memory taken by the loaded models stays within it. The memory of a
+model is measured as the growth of the process' resident memory while it is loaded.
+'''
+
+import os
+import gc
+import threading
+from collections import OrderedDict
+import spacy
+
+# Model of each supported language
+MODELS = {'en': 'en_core_web_lg', 'pt': 'pt'}
+
+
+def resident_memory():
+    '''
+    Returns the resident memory of the process, in bytes (0 if it can't be read)
+    '''
+    try:
+        with open('/proc/self/statm', 'r') as file_descriptor:
+            pages = int(file_descriptor.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def create_registry(memory_budget=None, models=None, loader=spacy.load):
+    '''
+    Creates an empty registry (memory_budget in bytes, None for no limit)
+    '''
+    return {'models': models or MODELS, 'budget': memory_budget, 'loader': loader,
+            'loaded': OrderedDict(), 'sizes': {}, 'lock': threading.Lock()}
+
+
+def evict_models(registry, needed=0, keep=0):
+    '''
+    Evicts the least recently used models (keeping at least the keep most recently used ones) until
+    the loaded models and the needed memory fit in the memory budget
+    '''
+    loaded = registry['loaded']
+    sizes = registry['sizes']
+    if registry['budget'] is None:
+        return
+    evicted = False
+    while len(loaded) > keep and sum(sizes[lang] for lang in loaded) + needed > registry['budget']:
+        loaded.popitem(last=False)
+        evicted = True
+    if evicted:
+        gc.collect()
+
+
+def get_model(registry, lang):
+    '''
+    Returns the model of a language, loading it if needed (KeyError if the language isn't supported)
+    '''
+    with registry['lock']:
+        loaded = registry['loaded']
+        if lang in loaded:
+            loaded.move_to_end(lang)
+            return loaded[lang]
+
+        # Models loaded before have a known size, so room is made for them before loading
+        name = registry['models'][lang]
+        evict_models(registry, registry['sizes'].get(lang, 0))
+        before = resident_memory()
+        nlp = registry['loader'](name)
+        registry['sizes'][lang] = max(resident_memory() - before, registry['sizes'].get(lang, 0))
+        loaded[lang] = nlp
+
+        # The model just loaded is kept, even if it doesn't fit in the budget by itself
+        evict_models(registry, keep=1)
+        return nlp
+
+
+def preload_models(registry, langs):
+    '''
+    Loads the models of a list of languages (pre-warming the registry)
+    '''
+    for lang in langs:
+        get_model(registry, lang)
+
+
+__author__ = "João Barreira, Mafalda Nunes"
+__email__ = "a73831@alunos.uminho.pt, a77364@alunos.uminho.pt"
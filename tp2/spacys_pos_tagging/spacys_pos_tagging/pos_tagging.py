@@ -10,14 +10,25 @@ These functions support both the web app as well as the terminal client.
 '''
 
 import re
+from collections import Counter
 import spacy
 from spacy import displacy
+from spacy.tokens import Doc
 from prettytable import PrettyTable
 import matplotlib as mpl
 mpl.use('Agg')
 from matplotlib import pyplot as plt
 
 
+def iter_docs(doc):
+    '''
+    Returns the documents to process: either a single doc or an iterable of docs (e.g. from nlp.pipe)
+    '''
+    if isinstance(doc, Doc):
+        return [doc]
+    return doc
+
+
 def generate_html_table(headers, data):
     '''
     Generates html table with token's info
@@ -43,16 +54,27 @@ def generate_table(headers, data):
     return table
 
 
-def generate_pos_chart(doc, filename='pos_frequence.svg', style='html'):
+def count_pos(document, counts=None):
+    '''
+    Adds the PoS tags of a doc to the counts gathered so far (new counts if None)
     '''
-    Generates PoS chart
+    if counts is None:
+        counts = {'tags': {}, 'count': Counter(), 'total': 0}
+    counts['tags'].update((w.pos, w.pos_) for w in document if w.pos not in counts['tags'])
+    counts['count'].update(document.count_by(spacy.attrs.POS))
+    counts['total'] += len(document)
+    return counts
+
+
+def pos_chart(counts, filename='pos_frequence.svg', style='html'):
+    '''
+    Generates PoS chart from the counts gathered by count_pos
     '''
-    tag_dict = {w.pos : w.pos_ for w in doc}
     pos_freq = []
     pos_tags = []
-    for pos_id, freq in doc.count_by(spacy.attrs.POS).items():
-        pos_freq.append(freq / len(doc))
-        pos_tags.append(tag_dict[pos_id])
+    for pos_id, freq in (counts['count'].items() if counts else []):
+        pos_freq.append(freq / counts['total'])
+        pos_tags.append(counts['tags'][pos_id])
     res = None
     if style == 'html':
         res = [['POS Tag', 'POS Frequence (%)']] + [list(x) for x in zip(pos_tags, pos_freq)]
@@ -62,16 +84,26 @@ def generate_pos_chart(doc, filename='pos_frequence.svg', style='html'):
     return res
 
 
-def generate_information(doc, vocab, style='html'):
+def generate_pos_chart(doc, filename='pos_frequence.svg', style='html'):
     '''
-    Generates table with token's info
+    Generates PoS chart (aggregated over all docs)
     '''
-    headers = ["Text", "Lemma", "POS", "TAG", "DEP", "SHAPE", "MORPHOLOGIAL INFO",
-               "IS_ALPHA", "IS_STOP"]
-    data = []
-    tokens = []
+    counts = None
+    for document in iter_docs(doc):
+        counts = count_pos(document, counts)
+    return pos_chart(counts, filename, style)
+
+
+def collect_information(document, vocab, collected=None):
+    '''
+    Adds the info of the tokens of a doc to the info collected so far (new if None)
+    '''
+    if collected is None:
+        collected = {'data': [], 'tokens': set()}
+    data = collected['data']
+    tokens = collected['tokens']
 
-    for token in doc:
+    for token in document:
         if (str(token.pos_) != 'SPACE' and str(token.pos_) != 'PUNCT') or token.text not in tokens:
             if token.tag_:
                 morph_info = dict(filter(lambda x: x[0] != 74,
@@ -83,7 +115,17 @@ def generate_information(doc, vocab, style='html'):
             data.append([str(s) for s in (token.text, token.lemma_, token.pos_, token.tag_,
                                           token.dep_, token.shape_, morph_info, token.is_alpha,
                                           token.is_stop)])
-            tokens.append(token.text)
+            tokens.add(token.text)
+    return collected
+
+
+def information_table(collected, style='html'):
+    '''
+    Generates table with token's info from the info gathered by collect_information
+    '''
+    headers = ["Text", "Lemma", "POS", "TAG", "DEP", "SHAPE", "MORPHOLOGIAL INFO",
+               "IS_ALPHA", "IS_STOP"]
+    data = collected['data'] if collected else []
     res = None
     if style == 'html':
         res = generate_html_table(headers, data)
@@ -92,20 +134,45 @@ def generate_information(doc, vocab, style='html'):
     return res
 
 
+def generate_information(doc, vocab, style='html'):
+    '''
+    Generates table with token's info (of the tokens of all docs)
+    '''
+    collected = None
+    for document in iter_docs(doc):
+        collected = collect_information(document, vocab, collected)
+    return information_table(collected, style)
+
+
+def dependencies_options(characteristics=(False, 'white', 'black', 'Source Sans Pro')):
+    '''
+    Returns displacy's options of a dependency graph (compact, background, color and font)
+    '''
+    return {'compact': characteristics[0], 'bg': characteristics[1], 'color': characteristics[2],
+            'font': characteristics[3]}
+
+
+def render_dependencies(document, options=None):
+    '''
+    Renders the dependency graph of each sentence of a doc to a picture, as the sentences are read
+    '''
+    options = options or dependencies_options()
+    for sent in document.sents:
+        yield displacy.render(sent, style='dep', options=options)
+
+
 def generate_dependencies_graph(doc, style='service', \
                                 characteristics=(False, 'white', 'black', 'Source Sans Pro')):
     '''
-    Generates dependency graph to HTML, web server or picture
+    Generates dependency graph (of the sentences of all docs) to HTML, web server or picture
     '''
     res = []
-    compact = characteristics[0]
-    background = characteristics[1]
-    color = characteristics[2]
-    font = characteristics[3]
-
-    if style in ('service', 'html', 'pict'):
-        docs = list(doc.sents)
-        options = {'compact': compact, 'bg': background, 'color': color, 'font': font}
+    options = dependencies_options(characteristics)
+
+    # Each sentence keeps its doc alive, so the sentences of all docs are only listed when displacy
+    # needs them at once
+    if style in ('service', 'html'):
+        docs = [sent for document in iter_docs(doc) for sent in document.sents]
     if style == 'service':
         displacy.serve(docs, style='dep', options=options)
     elif style == 'html':
@@ -113,15 +180,29 @@ def generate_dependencies_graph(doc, style='service', \
         html = re.sub(r'.*<body[^>]*>(.*)</body>.*', r'\1', html, flags=re.DOTALL)
         res.append(html)
     elif style == 'pict':
-        for document in docs:
-            pict = displacy.render(document, style='dep', options=options)
-            res.append(pict)
+        for document in iter_docs(doc):
+            res.extend(render_dependencies(document, options))
     return res
 
 
+def tag_words(document, res_list=None):
+    '''
+    Adds the words of a doc, tagged with their entities, to the tagged words so far (new if None)
+    '''
+    if res_list is None:
+        res_list = []
+    for word in document:
+        if word.ent_type_:
+            res_list.append(str(word) + '{' + word.ent_type_ + '}')
+        else:
+            res_list.append(str(word))
+    return res_list
+
+
 def generate_tagged_text(doc, style='server', entities=None, colors=None):
     '''
     Generates either text with entities or graphical entity visualizer to html or web server
+    (of all docs)
     '''
     res = ''
     if style in ('server', 'html'):
@@ -130,18 +211,17 @@ def generate_tagged_text(doc, style='server', entities=None, colors=None):
             options['ents'] = entities
         if colors:
             options['colors'] = colors
+        if not isinstance(doc, Doc):
+            doc = list(doc)
         if style == 'server':
             displacy.serve(doc, style='ent', options=options)
         else:
             res = displacy.render(doc, style='ent', options=options)
     else:
-        res_list = []
-        for word in doc:
-            if word.ent_type_:
-                res_list.append(str(word) + '{' + word.ent_type_ + '}')
-            else:
-                res_list.append(str(word))
-        res = ' '.join(res_list)
+        res_list = None
+        for document in iter_docs(doc):
+            res_list = tag_words(document, res_list)
+        res = ' '.join(res_list or [])
     return res
 
 